@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+# ----------------------
+# Custom Imports
+# ----------------------
+import utils
+from settings import CommonConfig
+
+
+if __name__ == "__main__":
+    # Usage: python build_price_index.py <offer file> [<offer file> ...]
+    # Offer files are the bulk Price List JSON or CSV downloads, e.g. per region for
+    # AmazonEC2 (CSV only), AmazonVPC, AmazonCloudWatch, AmazonKinesis and AmazonDynamoDB.
+    # Indexes built before the License Model column was added must be rebuilt.
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python build_price_index.py <offer file> [<offer file> ...]")
+
+    utils.PriceIndex.build([Path(arg) for arg in sys.argv[1:]], CommonConfig.PRICE_INDEX_PATH)
@@ -1,37 +1,96 @@
+import argparse
+import multiprocessing
+import utils
 import pipelines
 from utils import logger
 from settings import CommonConfig
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
-pipelines_to_run = [
-    pipelines.NATUnusedPipeline,
-    pipelines.EBSUnusedPipeline,
-    pipelines.EC2UnusedPipeline,
-    pipelines.EIPUnusedPipeline,
-    pipelines.SnapshotOldPipeline,
-    pipelines.DynamoDBUnusedPipeline,
-    pipelines.LogsNeverExpirePipeline,
-    pipelines.LogsHighIngestionPipeline,
-    pipelines.LambdaExcessMemoryPipeline,
-    pipelines.KinesisExcessShardsPipeline,
-]
-
-def run_pipeline(pipeline_cls):
-    pipeline_name = pipeline_cls.__name__
+
+def parse_args() -> argparse.Namespace:
+    names = ", ".join(pipelines.short_name(class_name) for class_name in pipelines.PIPELINE_MODULES)
+    parser = argparse.ArgumentParser(description="Find unused and oversized AWS resources.")
+    parser.add_argument("--only", help=f"Comma-separated pipelines to run ({names}).")
+    parser.add_argument("--skip", help="Comma-separated pipelines to leave out.")
+    return parser.parse_args()
+
+
+def select_pipelines(only: str = None, skip: str = None) -> list[str]:
+    def split(value: str) -> list[str]:
+        return [name.strip() for name in value.split(",") if name.strip()]
+
+    selected = pipelines.resolve_names(split(only)) if only else list(pipelines.PIPELINE_MODULES)
+    skipped = set(pipelines.resolve_names(split(skip))) if skip else set()
+    return [class_name for class_name in selected if class_name not in skipped]
+
+
+def get_mp_context():
+    """
+    With WARM_START, workers fork from a forkserver that preloaded warm_start (boto3
+    and the parsed service models) instead of cold-starting a fresh interpreter.
+    """
+    if not CommonConfig.WARM_START or "forkserver" not in multiprocessing.get_all_start_methods():
+        return None
+
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["warm_start"])
+    return context
+
+
+def run_pipeline(pipeline_name: str, accounts: list[str], regions: list[str]):
+    # Only the selected pipeline's module is imported in the worker process.
+    pipeline_cls = pipelines.get_pipeline(pipeline_name)
     logger.info(f"Starting pipeline: {pipeline_name}.")
-    pipeline = pipeline_cls()
-    pipeline.run()
+    pipeline_cls.run_units(accounts, regions)
     logger.info(f"Finished pipeline: {pipeline_name}.")
-    return pipeline_name
+    return pipeline_cls.CONFIG.WORKSHEET_NAME, pipeline_cls.CONFIG.OUTPUT_CSV
 
 
 if __name__ == "__main__":
-    with ProcessPoolExecutor(max_workers=CommonConfig.MAX_CPU_WORKERS) as executor:
-        futures = {executor.submit(run_pipeline, pipeline_cls): pipeline_cls for pipeline_cls in pipelines_to_run}
+    args = parse_args()
+    try:
+        pipelines_to_run = select_pipelines(args.only, args.skip)
+    except ValueError as exception:
+        raise SystemExit(str(exception))
+
+    reports = {}
+    accounts = utils.resolve_accounts()
+    regions = utils.resolve_regions()
+    logger.info(f"Scanning {len(accounts)} accounts in {len(regions)} regions: {', '.join(regions)}.")
+
+    # Resource listings (EC2 inventory, ...) are materialized once per run and shared.
+    utils.start_run()
+
+    if CommonConfig.METRIC_STORE:
+        utils.get_metric_store().prune()
+
+    # One adaptive rate limiter shared by every pipeline process.
+    rate_limiter_manager = utils.RateLimiterManager()
+    rate_limiter_manager.start()
+    rate_limiter = rate_limiter_manager.AdaptiveRateLimiter()
+
+    with ProcessPoolExecutor(
+        max_workers=CommonConfig.MAX_CPU_WORKERS,
+        mp_context=get_mp_context(),
+        initializer=utils.set_rate_limiter,
+        initargs=(rate_limiter,),
+    ) as executor:
+        futures = {executor.submit(run_pipeline, name, accounts, regions): name for name in pipelines_to_run}
         for future in as_completed(futures):
-            pipeline_cls = futures[future]
-            pipeline_name = pipeline_cls.__name__
+            pipeline_name = futures[future]
             try:
-                future.result()
+                worksheet_name, output_csv = future.result()
+                reports[worksheet_name] = output_csv
             except Exception:
                 logger.exception(f"ERROR in pipeline: {pipeline_name}.")
+
+    logger.info(f"Final request rates: {rate_limiter.rates()}.")
+    rate_limiter_manager.shutdown()
+    utils.end_run()
+
+    # Publishing all reports to the GSheet in one session.
+    if CommonConfig.WRITE_TO_GOOGLE_SHEET and reports:
+        try:
+            utils.SheetPublisher().publish(reports)
+        except Exception:
+            logger.exception("ERROR while publishing to the Google Sheet.")
@@ -1,10 +1,56 @@
-from pipelines.ebs_unused import EBSUnusedPipeline
-from pipelines.ec2_unused import EC2UnusedPipeline
-from pipelines.eip_unused import EIPUnusedPipeline
-from pipelines.nat_unused import NATUnusedPipeline
-from pipelines.snapshot_old import SnapshotOldPipeline
-from pipelines.dynamo_unused import DynamoDBUnusedPipeline
-from pipelines.logs_never_expire import LogsNeverExpirePipeline
-from pipelines.logs_high_ingestion import LogsHighIngestionPipeline
-from pipelines.lambda_excess_memory import LambdaExcessMemoryPipeline
-from pipelines.kinesis_excess_shards import KinesisExcessShardsPipeline
\ No newline at end of file
+"""
+Lazy pipeline registry: a pipeline module is imported the first time its class is
+accessed (`pipelines.EBSUnusedPipeline` or `get_pipeline("EBSUnused")`).
+"""
+import importlib
+
+PIPELINE_MODULES = {
+    "NATUnusedPipeline": "pipelines.nat_unused",
+    "EBSUnusedPipeline": "pipelines.ebs_unused",
+    "EC2UnusedPipeline": "pipelines.ec2_unused",
+    "EIPUnusedPipeline": "pipelines.eip_unused",
+    "SnapshotOldPipeline": "pipelines.snapshot_old",
+    "DynamoDBUnusedPipeline": "pipelines.dynamo_unused",
+    "LogsNeverExpirePipeline": "pipelines.logs_never_expire",
+    "LogsHighIngestionPipeline": "pipelines.logs_high_ingestion",
+    "LambdaExcessMemoryPipeline": "pipelines.lambda_excess_memory",
+    "KinesisExcessShardsPipeline": "pipelines.kinesis_excess_shards",
+}
+
+__all__ = list(PIPELINE_MODULES)
+
+
+def short_name(class_name: str) -> str:
+    return class_name.removesuffix("Pipeline")
+
+
+def resolve_names(short_names: list[str]) -> list[str]:
+    """
+    Maps short names (case-insensitive, e.g. "EBSUnused") to pipeline class names.
+    """
+    by_short_name = {short_name(class_name).lower(): class_name for class_name in PIPELINE_MODULES}
+
+    unknown = [name for name in short_names if name.lower() not in by_short_name]
+    if unknown:
+        choices = ", ".join(short_name(class_name) for class_name in PIPELINE_MODULES)
+        raise ValueError(f"Unknown pipelines: {', '.join(unknown)}. Choose from: {choices}.")
+
+    return [by_short_name[name.lower()] for name in short_names]
+
+
+def get_pipeline(name: str):
+    """
+    Returns the pipeline class for a class name or short name, importing its module.
+    """
+    class_name = name if name in PIPELINE_MODULES else resolve_names([name])[0]
+    return getattr(importlib.import_module(PIPELINE_MODULES[class_name]), class_name)
+
+
+def __getattr__(name: str):
+    if name in PIPELINE_MODULES:
+        return get_pipeline(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
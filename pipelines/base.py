@@ -1,9 +1,13 @@
+import time
+import queue
 import utils
-import pandas as pd
-from typing import Type
+import itertools
+import threading
+from typing import Any, Type
+from datetime import datetime, timedelta
 from utils import logger
 from settings import CommonConfig
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 
 
 class BasePipeline:
@@ -12,45 +16,263 @@ class BasePipeline:
 
     Subclasses MUST define:
       - CONFIG
-      - fetch_items()
+      - fetch_items(): a list, or a generator (e.g. over paginator pages) whose items
+        are streamed to the workers in STREAM_CHUNK_SIZE chunks while listing goes on.
       - process_item(item)
+
+    Subclasses MAY define:
+      - prefetch(items): fetch data for many items at once (e.g. batched metrics)
+        before they are handed to process_item. Called once per chunk when streaming.
+
+    With CONFIG.VERDICT_CACHE on, pipelines call load_verdicts() in prefetch to skip
+    resources whose cached verdict is still valid, and record_verdict() for the rest.
+
+    Each instance scans one (account, region) unit; run_units() fans a pipeline out
+    over many units into one report with trailing "Account" and "Region" columns.
     """
 
     CONFIG: Type[CommonConfig]
 
-    def __init__(self):
+    def __init__(self, account_id: str = None, region: str = None, results: utils.ResultSink = None):
         self.pipeline_name = self.__class__.__name__
-        utils.write_to_csv(self.CONFIG.OUTPUT_CSV, self.CONFIG.CSV_HEADERS, mode="w")
+        self.account_id = account_id or utils.get_home_account_id()
+        self.region = region or self.CONFIG.AWS_REGION
+
+        # Prefetched metrics: item key -> {label: MetricSeries}
+        self.metrics = {}
+
+        # Result rows, sorted and written once in post_process (shared across units)
+        self.results = results if results is not None else self.create_result_sink()
+
+        # Cached verdicts: resource id -> verdict (reused), and the ones to store after the run
+        self.verdicts: dict[str, Any] = {}
+        self.new_verdicts: dict[str, tuple[str, Any, float]] = {}
+        self.verdict_namespace = f"{self.pipeline_name}:{self.account_id}:{self.region}"
+        self._verdicts_lock = threading.Lock()
+
+    @classmethod
+    def create_result_sink(cls) -> utils.ResultSink:
+        return utils.ResultSink(cls.CONFIG.CSV_HEADERS + ["Account", "Region"], cls.CONFIG.SORT_BY_COLUMN, cls.CONFIG.SORT_ASCENDING)
 
     def fetch_items(self):
         raise NotImplementedError
 
+    def prefetch(self, items):
+        pass
+
+    def fetch_filters(self, operation: str) -> list[dict]:
+        """
+        Server-side filters for a listing call, from CONFIG.FETCH_FILTERS.
+        """
+        return self.CONFIG.FETCH_FILTERS.get(operation, [])
+
+    def use_metrics_insights(self) -> bool:
+        lookback_days = getattr(self.CONFIG, "LOOKBACK_DAYS", None)
+        return (
+            self.CONFIG.USE_METRICS_INSIGHTS
+            and lookback_days is not None
+            and lookback_days <= self.CONFIG.METRICS_INSIGHTS_MAX_LOOKBACK_DAYS
+        )
+
+    def metric_batcher(self, start_time: datetime, end_time: datetime) -> utils.MetricDataBatcher:
+        """
+        GetMetricData batcher on self.cw, backed by the local metric store when enabled.
+        """
+        store = utils.get_metric_store() if self.CONFIG.METRIC_STORE else None
+        return utils.MetricDataBatcher(
+            self.cw, start_time, end_time, store=store, scope=f"{self.account_id}:{self.region}",
+        )
+
+    def metric_values(self, key, label: str) -> list[float]:
+        series = self.metrics.get(key, {}).get(label)
+        return series.values if series else []
+
     def process_item(self, item) -> bool:
         raise NotImplementedError
 
+    def load_verdicts(self, fingerprints: dict[str, str]) -> None:
+        """
+        Loads the still-valid cached verdicts for {resource_id: fingerprint} into self.verdicts.
+        """
+        if not self.CONFIG.VERDICT_CACHE:
+            return
+
+        verdicts = utils.VerdictCache(self.CONFIG.VERDICT_CACHE_PATH).get(self.verdict_namespace, fingerprints)
+        self.verdicts.update(verdicts)
+        logger.info(f"[{self.pipeline_name}] Reusing {len(verdicts)} of {len(fingerprints)} cached verdicts.")
+
+    def record_verdict(self, resource_id: str, fingerprint: str, verdict: Any, watermark: datetime | None = None):
+        """
+        Records a fresh verdict. It stays valid for VERDICT_TTL_HOURS, or until the
+        metric datapoint that decided it (watermark) leaves the lookback window if that
+        comes sooner. Verdicts without a watermark are not cached.
+        """
+        if not self.CONFIG.VERDICT_CACHE or watermark is None:
+            return
+
+        valid_until = min(
+            time.time() + self.CONFIG.VERDICT_TTL_HOURS * 3600,
+            (watermark + timedelta(days=self.CONFIG.LOOKBACK_DAYS)).timestamp(),
+        )
+        with self._verdicts_lock:
+            self.new_verdicts[resource_id] = (fingerprint, verdict, valid_until)
+
+    def replay_row(self, row: list | None) -> bool:
+        """
+        Replays a cached verdict that is a report row (None: not reported).
+        """
+        if row is None:
+            return False
+        self.add_result(row)
+        return True
+
+    def save_verdicts(self):
+        if self.CONFIG.VERDICT_CACHE and self.new_verdicts:
+            utils.VerdictCache(self.CONFIG.VERDICT_CACHE_PATH).put(self.verdict_namespace, self.new_verdicts)
+
+    def last_timestamp_where(self, key, label: str, condition) -> datetime | None:
+        """
+        Timestamp of the latest datapoint of a prefetched series that meets condition.
+        """
+        series = self.metrics.get(key, {}).get(label)
+        if not series:
+            return None
+        return max((ts for ts, value in zip(series.timestamps, series.values) if condition(value)), default=None)
+
+    def add_result(self, row: list):
+        self.results.add(row + [self.account_id, self.region])
+
     def post_process(self):
 
-        # Sorting and saving the CSV.
-        df = pd.read_csv(self.CONFIG.OUTPUT_CSV, encoding = "utf-8", index_col = False)
-        df.sort_values(self.CONFIG.SORT_BY_COLUMN, ascending = self.CONFIG.SORT_ASCENDING, inplace = True)
+        # Sorting and saving the CSV (published to the GSheet by main once all pipelines finish).
+        self.results.write_csv(self.CONFIG.OUTPUT_CSV)
+        self.results.close()
 
-        # Writing the DataFrame to the GSheet.
-        if CommonConfig.WRITE_TO_GOOGLE_SHEET and not df.empty:
-            utils.write_df_to_sheet(self.CONFIG.WORKSHEET_NAME, df)
-            logger.info(f"[{self.pipeline_name}] Updated the {self.CONFIG.WORKSHEET_NAME} sheet successfully.")
+    def _stream_chunks(self, items):
+        """
+        Yields lists of up to STREAM_CHUNK_SIZE items. A producer thread drains the items
+        iterable (and so the paginator) ahead of the consumer, at most
+        STREAM_QUEUE_CHUNKS chunks ahead. Closing the generator (or the consumer
+        failing) stops the producer instead of leaving it blocked on a full queue.
+        """
+        chunks = queue.Queue(maxsize=self.CONFIG.STREAM_QUEUE_CHUNKS)
+        stop = threading.Event()
+        end = object()
 
-    def run(self):
+        def put(value) -> bool:
+            while not stop.is_set():
+                try:
+                    chunks.put(value, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            iterator = iter(items)
+            try:
+                while chunk := list(itertools.islice(iterator, self.CONFIG.STREAM_CHUNK_SIZE)):
+                    if not put(chunk):
+                        return
+            except Exception as e:
+                put(e)
+            finally:
+                put(end)
+
+        threading.Thread(target=produce, name=f"{self.pipeline_name}-producer", daemon=True).start()
+
+        try:
+            while (chunk := chunks.get()) is not end:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            stop.set()
+            while not chunks.empty():
+                chunks.get_nowait()
+
+    def collect(self) -> int:
+        """
+        Fetches and processes this unit's items into the result sink.
+        Returns the number of relevant items.
+
+        At most STREAM_MAX_IN_FLIGHT items are submitted to the thread pool at a time,
+        so a streamed chunk is prefetched while the previous one is still processing.
+        """
         items = self.fetch_items()
-        logger.info(f"[{self.pipeline_name}] Processing {len(items)} items.")
+
+        if isinstance(items, list):
+            logger.info(f"[{self.pipeline_name}] [{self.account_id}/{self.region}] Processing {len(items)} items.")
+            chunks = [items]
+        else:
+            logger.info(f"[{self.pipeline_name}] [{self.account_id}/{self.region}] Streaming items.")
+            chunks = self._stream_chunks(items)
 
         processed_count = 0
+        pending = set()
 
-        with ThreadPoolExecutor(max_workers=self.CONFIG.MAX_WORKERS) as executor:
-            futures = [executor.submit(self.process_item, item) for item in items]
+        def harvest(done) -> int:
+            return sum(1 for future in done if future.result())
 
-            for future in as_completed(futures):
-                if future.result():
-                    processed_count += 1
+        try:
+            with ThreadPoolExecutor(max_workers=self.CONFIG.MAX_WORKERS) as executor:
+                for chunk in chunks:
+                    self.prefetch(chunk)
+
+                    for item in chunk:
+                        if len(pending) >= self.CONFIG.STREAM_MAX_IN_FLIGHT:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            processed_count += harvest(done)
+                        pending.add(executor.submit(self.process_item, item))
+
+                processed_count += harvest(as_completed(pending))
+        finally:
+            if not isinstance(chunks, list):
+                # Stops the producer thread when a chunk fails.
+                chunks.close()
 
+        self.save_verdicts()
+        return processed_count
+
+    def run(self):
+        processed_count = self.collect()
         self.post_process()
         logger.info(f"[{self.pipeline_name}] Found {processed_count} relevant items.")
+
+    @classmethod
+    def run_units(cls, accounts: list[str], regions: list[str]):
+        """
+        Runs the pipeline for every (account, region) unit, MAX_UNIT_WORKERS at a time,
+        and writes one merged report. A failing unit is logged and left out of the report.
+        """
+        results = cls.create_result_sink()
+
+        # Region-major order: units running side by side belong to different accounts,
+        # so they draw on separate per-account API quotas.
+        units = [(account_id, region) for region in regions for account_id in accounts]
+
+        if not units:
+            # Still writes the (empty) report, which main publishes with the others.
+            logger.info(f"[{cls.__name__}] No account/region units to scan.")
+            results.write_csv(cls.CONFIG.OUTPUT_CSV)
+            results.close()
+            return
+
+        def run_unit(account_id: str, region: str) -> int:
+            return cls(account_id, region, results).collect()
+
+        processed_count = 0
+
+        with ThreadPoolExecutor(max_workers=min(cls.CONFIG.MAX_UNIT_WORKERS, len(units))) as executor:
+            futures = {executor.submit(run_unit, *unit): unit for unit in units}
+
+            for future in as_completed(futures):
+                try:
+                    processed_count += future.result()
+                except Exception:
+                    account_id, region = futures[future]
+                    logger.exception(f"[{cls.__name__}] ERROR in account {account_id}, region {region}.")
+
+        results.write_csv(cls.CONFIG.OUTPUT_CSV)
+        results.close()
+        logger.info(f"[{cls.__name__}] Found {processed_count} relevant items across {len(units)} account/region units.")
@@ -1,4 +1,6 @@
+import numpy as np
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 
 # ----------------------
 # Custom Imports
@@ -12,58 +14,35 @@ from pipelines.base import BasePipeline
 class DynamoDBUnusedPipeline(BasePipeline):
     CONFIG = DynamoDBUnusedConfig
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, account_id: str = None, region: str = None, results: utils.ResultSink = None):
+        super().__init__(account_id, region, results)
 
         # Clients
-        session = utils.create_boto3_session()
-        self.ddb = session.client("dynamodb")
-        self.cw = session.client("cloudwatch")
+        self.ddb = utils.get_client("dynamodb", self.region, self.account_id)
+        self.cw = utils.get_client("cloudwatch", self.region, self.account_id)
 
         # Time range
         self.end_time = datetime.now(timezone.utc)
         self.start_time = self.end_time - timedelta(days=self.CONFIG.LOOKBACK_DAYS)
 
+        # Table descriptions: table_name -> describe_table()["Table"]
+        self.table_descs = {}
+
+        # Capacity analysis: table_name -> {read, write, rcu, wcu}
+        self.capacity = {}
+
     # ----------------------
     # Private helpers
     # ----------------------
-    def _get_consumed_units(self, table_name: str, metric_name: str, index_name: str | None = None) -> float:
-        dimensions = [{"Name": "TableName", "Value": table_name}]
-        if index_name:
-            dimensions.append({"Name": "GlobalSecondaryIndexName", "Value": index_name})
-
-        resp = self.cw.get_metric_statistics(
-            Namespace="AWS/DynamoDB",
-            MetricName=metric_name,
-            Dimensions=dimensions,
-            StartTime=self.start_time,
-            EndTime=self.end_time,
-            Period=86400,
-            Statistics=["Sum"],
-        )
-
-        return sum(dp.get("Sum", 0) for dp in resp.get("Datapoints", []))
-
-    def _get_avg_provisioned_units(self, table_name: str, metric_name: str, index_name: str | None = None) -> float:
-        dimensions = [{"Name": "TableName", "Value": table_name}]
-        if index_name:
-            dimensions.append({"Name": "GlobalSecondaryIndexName", "Value": index_name})
-
-        resp = self.cw.get_metric_statistics(
-            Namespace="AWS/DynamoDB",
-            MetricName=metric_name,
-            Dimensions=dimensions,
-            StartTime=self.start_time,
-            EndTime=self.end_time,
-            Period=86400,
-            Statistics=["Average"],
-        )
+    def _describe_table(self, table_name: str) -> dict:
+        return self.ddb.describe_table(TableName=table_name)["Table"]
 
-        datapoints = resp.get("Datapoints", [])
-        if not datapoints:
-            return 0.0
+    def _is_old_enough(self, desc: dict) -> bool:
+        min_age = timedelta(days=self.CONFIG.LOOKBACK_DAYS + 1)
+        return self.end_time - desc["CreationDateTime"] >= min_age
 
-        return sum(dp.get("Average", 0) for dp in datapoints) / len(datapoints)
+    def _get_billing_mode(self, desc: dict) -> str:
+        return desc.get("BillingModeSummary", {}).get("BillingMode", "PROVISIONED")
 
     def _get_storage_and_item_counts(self, table_desc: dict) -> tuple[int, float]:
         table_items = table_desc.get("ItemCount", 0)
@@ -81,34 +60,43 @@ class DynamoDBUnusedPipeline(BasePipeline):
     def _get_gsi_list(self, table_desc: dict) -> list[dict]:
         return table_desc.get("GlobalSecondaryIndexes", [])
 
-    def _get_provisioned_capacity(self, table_name: str, gsi_list: list[dict]) -> tuple[float, float]:
-        provisioned_rcu = 0.0
-        provisioned_wcu = 0.0
-
-        provisioned_rcu += self._get_avg_provisioned_units(table_name, "ProvisionedReadCapacityUnits")
-        provisioned_wcu += self._get_avg_provisioned_units(table_name, "ProvisionedWriteCapacityUnits")
-
-        for gsi in gsi_list:
-            index_name = gsi["IndexName"]
-            provisioned_rcu += self._get_avg_provisioned_units(table_name, "ProvisionedReadCapacityUnits", index_name=index_name)
-            provisioned_wcu += self._get_avg_provisioned_units(table_name, "ProvisionedWriteCapacityUnits", index_name=index_name)
-
-        return provisioned_rcu, provisioned_wcu
-
-    def _get_consumed_capacity(self, table_name: str, gsi_list: list[dict]) -> tuple[float, float]:
-        total_read = self._get_consumed_units(table_name, "ConsumedReadCapacityUnits")
-        total_write = self._get_consumed_units(table_name, "ConsumedWriteCapacityUnits")
-
-        for gsi in gsi_list:
-            index_name = gsi["IndexName"]
-            total_read += self._get_consumed_units(table_name, "ConsumedReadCapacityUnits", index_name=index_name)
-            total_write += self._get_consumed_units(table_name, "ConsumedWriteCapacityUnits", index_name=index_name)
-
-        return total_read, total_write
-
-    def _is_pitr_enabled(self, table_name: str) -> bool:
-        resp = self.ddb.describe_continuous_backups(TableName=table_name)
-
+    def _analyze_capacity(self, table_names: list[str]) -> None:
+        """
+        Consumed and provisioned capacity of every table (GSIs included) in one
+        vectorized pass over the (table/index x time) metric matrices.
+        """
+        keys = [
+            (table_name, index_name)
+            for table_name in table_names
+            for index_name in [None] + [gsi["IndexName"] for gsi in self._get_gsi_list(self.table_descs[table_name])]
+        ]
+        position = {table_name: i for i, table_name in enumerate(table_names)}
+        table_index = np.array([position[table_name] for table_name, _ in keys], dtype=int)
+
+        def per_table(values: np.ndarray) -> np.ndarray:
+            totals = np.zeros(len(table_names))
+            np.add.at(totals, table_index, values)
+            return totals
+
+        capacity = {}
+        for name, metric_name, stat in [
+            ("read", "ConsumedReadCapacityUnits", "sum"),
+            ("write", "ConsumedWriteCapacityUnits", "sum"),
+            ("rcu", "ProvisionedReadCapacityUnits", "mean"),
+            ("wcu", "ProvisionedWriteCapacityUnits", "mean"),
+        ]:
+            matrix, _ = utils.metric_matrix(self.metrics, keys, metric_name)
+            capacity[name] = per_table(utils.summarize_rows(matrix)[stat])
+
+        for i, table_name in enumerate(table_names):
+            self.capacity[table_name] = {name: values[i].item() for name, values in capacity.items()}
+
+    def _get_capacity(self, table_name: str) -> dict[str, float]:
+        if self.table_descs[table_name]["TableStatus"] != "ACTIVE":
+            return {"read": 0.0, "write": 0.0, "rcu": 0.0, "wcu": 0.0}
+        return self.capacity[table_name]
+
+    def _is_pitr_enabled(self, resp: dict) -> bool:
         status = (
             resp.get("ContinuousBackupsDescription", {})
             .get("PointInTimeRecoveryDescription", {})
@@ -130,32 +118,64 @@ class DynamoDBUnusedPipeline(BasePipeline):
 
         return tables
 
-    def process_item(self, table_name: str) -> bool:
-        desc = self.ddb.describe_table(TableName=table_name)["Table"]
+    def prefetch(self, table_names: list[str]):
+        with ThreadPoolExecutor(max_workers=self.CONFIG.MAX_WORKERS) as executor:
+            self.table_descs.update(zip(table_names, executor.map(self._describe_table, table_names)))
 
-        table_status = desc["TableStatus"]
-        created_at = desc["CreationDateTime"]
+        candidates = [
+            table_name
+            for table_name in table_names
+            if self.table_descs[table_name]["TableStatus"] == "ACTIVE" and self._is_old_enough(self.table_descs[table_name])
+        ]
+        batcher = self.metric_batcher(self.start_time, self.end_time)
 
-        min_age = timedelta(days=self.CONFIG.LOOKBACK_DAYS + 1)
-        if self.end_time - created_at < min_age:
+        for table_name in candidates:
+            desc = self.table_descs[table_name]
+
+            metrics = [("ConsumedReadCapacityUnits", "Sum"), ("ConsumedWriteCapacityUnits", "Sum")]
+            if self._get_billing_mode(desc) == "PROVISIONED":
+                metrics += [("ProvisionedReadCapacityUnits", "Average"), ("ProvisionedWriteCapacityUnits", "Average")]
+
+            index_names = [None] + [gsi["IndexName"] for gsi in self._get_gsi_list(desc)]
+            for index_name in index_names:
+                dimensions = [{"Name": "TableName", "Value": table_name}]
+                if index_name:
+                    dimensions.append({"Name": "GlobalSecondaryIndexName", "Value": index_name})
+
+                for metric_name, stat in metrics:
+                    batcher.add((table_name, index_name), metric_name, "AWS/DynamoDB", metric_name, dimensions, 86400, stat)
+
+        self.metrics.update(batcher.execute())
+        self._analyze_capacity(candidates)
+
+    def process_item(self, table_name: str) -> bool:
+        if not self._is_old_enough(self.table_descs[table_name]):
             return False
 
-        billing_mode = desc.get("BillingModeSummary", {}).get("BillingMode", "PROVISIONED")
-        pitr_enabled = self._is_pitr_enabled(table_name)
+        resp = self.ddb.describe_continuous_backups(TableName=table_name)
+        self.add_result(self._build_row(table_name, self._get_capacity(table_name), self._is_pitr_enabled(resp)))
+        return True
+
+    def _build_row(self, table_name: str, capacity: dict[str, float], pitr_enabled: bool) -> list:
+        desc = self.table_descs[table_name]
+
+        table_status = desc["TableStatus"]
+        created_at = desc["CreationDateTime"]
+        billing_mode = self._get_billing_mode(desc)
 
         gsi_list = self._get_gsi_list(desc)
         gsi_count = len(gsi_list)
 
         table_items, gsi_items, table_size_gb, gsi_size_gb = self._get_storage_and_item_counts(desc)
 
-        provisioned_rcu = provisioned_wcu = 0.0
-        total_read_units = total_write_units = 0.0
-
-        if table_status == "ACTIVE":
-            total_read_units, total_write_units = self._get_consumed_capacity(table_name, gsi_list)
+        provisioned_rcu, provisioned_wcu = capacity["rcu"], capacity["wcu"]
+        total_read_units, total_write_units = capacity["read"], capacity["write"]
 
-            if billing_mode == "PROVISIONED":
-                provisioned_rcu, provisioned_wcu = self._get_provisioned_capacity(table_name, gsi_list)
+        monthly_cost = (
+            utils.monthly_usage_cost("AmazonDynamoDB", self.region, "TimedStorage-ByteHrs", table_size_gb + gsi_size_gb)
+            + utils.monthly_usage_cost("AmazonDynamoDB", self.region, "ReadCapacityUnit-Hrs", provisioned_rcu, hourly=True)
+            + utils.monthly_usage_cost("AmazonDynamoDB", self.region, "WriteCapacityUnit-Hrs", provisioned_wcu, hourly=True)
+        )
 
         row = [
             table_name,
@@ -172,7 +192,7 @@ class DynamoDBUnusedPipeline(BasePipeline):
             table_status,
             gsi_count,
             "YES" if pitr_enabled else "NO",
+            round(monthly_cost, 2),
         ]
 
-        utils.write_to_csv(self.CONFIG.OUTPUT_CSV, row, mode="a")
-        return True
+        return row
@@ -11,14 +11,14 @@ from pipelines.base import BasePipeline
 
 class EBSUnusedPipeline(BasePipeline):
     CONFIG = EBSUnusedConfig
+    METRICS = {"r": "VolumeReadOps", "w": "VolumeWriteOps"}
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, account_id: str = None, region: str = None, results: utils.ResultSink = None):
+        super().__init__(account_id, region, results)
 
         # Clients
-        session = utils.create_boto3_session()
-        self.ec2 = session.client("ec2")
-        self.cw = session.client("cloudwatch")
+        self.ec2 = utils.get_client("ec2", self.region, self.account_id)
+        self.cw = utils.get_client("cloudwatch", self.region, self.account_id)
 
         # Time range
         self.end_time = datetime.now(timezone.utc)
@@ -48,42 +48,24 @@ class EBSUnusedPipeline(BasePipeline):
 
         return False
 
-    def _is_volume_active(self, volume_id: str) -> bool:
-        resp = self.cw.get_metric_data(
-            MetricDataQueries=[
-                {
-                    "Id": "r",
-                    "MetricStat": {
-                        "Metric": {
-                            "Namespace": "AWS/EBS",
-                            "MetricName": "VolumeReadOps",
-                            "Dimensions": [{"Name": "VolumeId", "Value": volume_id}],
-                        },
-                        "Period": 86400,
-                        "Stat": "Sum",
-                    },
-                    "ReturnData": True,
-                },
-                {
-                    "Id": "w",
-                    "MetricStat": {
-                        "Metric": {
-                            "Namespace": "AWS/EBS",
-                            "MetricName": "VolumeWriteOps",
-                            "Dimensions": [{"Name": "VolumeId", "Value": volume_id}],
-                        },
-                        "Period": 86400,
-                        "Stat": "Sum",
-                    },
-                    "ReturnData": True,
-                },
-            ],
-            StartTime=self.start_time,
-            EndTime=self.end_time,
+    def _fingerprint(self, volume: dict) -> str:
+        # The settings that decide the verdict are part of it, so changing them re-evaluates.
+        return utils.fingerprint(
+            self.CONFIG.LOOKBACK_DAYS,
+            volume["VolumeType"],
+            volume["Size"],
+            volume.get("State"),
+            volume["CreateTime"],
+            sorted((tag["Key"], tag["Value"]) for tag in volume.get("Tags", [])),
         )
 
-        for result in resp.get("MetricDataResults", []):
-            if any(v > 0 for v in result.get("Values", [])):
+    def _get_last_active(self, volume_id: str):
+        timestamps = [self.last_timestamp_where(volume_id, label, lambda v: v > 0) for label in self.METRICS]
+        return max((ts for ts in timestamps if ts), default=None)
+
+    def _is_volume_active(self, volume_id: str) -> bool:
+        for label in self.METRICS:
+            if any(v > 0 for v in self.metric_values(volume_id, label)):
                 return True
 
         return False
@@ -93,8 +75,21 @@ class EBSUnusedPipeline(BasePipeline):
     # -------------------------------
     def fetch_items(self):
         logger.info("Fetching all EBS volumes.")
-        response = self.ec2.describe_volumes()
-        return response.get("Volumes", [])
+        return list(utils.get_ec2_inventory(self.ec2, self.account_id, self.region).volumes.values())
+
+    def prefetch(self, volumes: list[dict]):
+        volumes = [volume for volume in volumes if not self._is_protected_volume(volume.get("Tags", []))]
+        self.load_verdicts({volume["VolumeId"]: self._fingerprint(volume) for volume in volumes})
+        volume_ids = [volume["VolumeId"] for volume in volumes if volume["VolumeId"] not in self.verdicts]
+
+        batcher = self.metric_batcher(self.start_time, self.end_time)
+
+        for volume_id in volume_ids:
+            dimensions = [{"Name": "VolumeId", "Value": volume_id}]
+            for label, metric_name in self.METRICS.items():
+                batcher.add(volume_id, label, "AWS/EBS", metric_name, dimensions, 86400, "Sum")
+
+        self.metrics.update(batcher.execute())
 
     def process_item(self, volume: dict) -> bool:
         tags = volume.get("Tags", [])
@@ -106,7 +101,12 @@ class EBSUnusedPipeline(BasePipeline):
         if self._is_protected_volume(tags):
             return False
 
+        if volume_id in self.verdicts:
+            return self.replay_row(self.verdicts[volume_id])
+
         if self._is_volume_active(volume_id):
+            # Stays active at least until its last I/O leaves the lookback window.
+            self.record_verdict(volume_id, self._fingerprint(volume), None, self._get_last_active(volume_id))
             return False
 
         size_gb = volume["Size"]
@@ -117,6 +117,11 @@ class EBSUnusedPipeline(BasePipeline):
             else volume["CreateTime"]
         )
 
-        row = [volume_id, size_gb, volume_type, create_time]
-        utils.write_to_csv(self.CONFIG.OUTPUT_CSV, row, mode="a")
+        monthly_cost = 0.0
+        price_index = utils.get_price_index()
+        if price_index is not None:
+            monthly_cost = size_gb * price_index.ebs_gb_month_price(volume_type, self.region)
+
+        row = [volume_id, size_gb, volume_type, create_time, round(monthly_cost, 2)]
+        self.add_result(row)
         return True
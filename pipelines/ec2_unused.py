@@ -1,3 +1,4 @@
+import numpy as np
 from datetime import datetime, timedelta, timezone
 
 # ----------------------
@@ -11,106 +12,142 @@ from pipelines.base import BasePipeline
 
 class EC2UnusedPipeline(BasePipeline):
     CONFIG = EC2UnusedConfig
+    METRICS = {"cpu": "CPUUtilization", "netin": "NetworkIn", "netout": "NetworkOut"}
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, account_id: str = None, region: str = None, results: utils.ResultSink = None):
+        super().__init__(account_id, region, results)
 
         # Clients
-        session = utils.create_boto3_session()
-        self.ec2 = session.client("ec2")
-        self.cw = session.client("cloudwatch")
-        self.pricing = utils.EC2Pricing(session)
+        self.ec2 = utils.get_client("ec2", self.region, self.account_id)
+        self.cw = utils.get_client("cloudwatch", self.region, self.account_id)
+        self.pricing = utils.EC2Pricing(self.region, self.account_id)
 
         # Time range
         self.end_time = datetime.now(timezone.utc)
         self.start_time = self.end_time - timedelta(days=self.CONFIG.LOOKBACK_DAYS)
 
+        # Analysis results: instance id -> (max cpu, max net in, max net out), busy flag, busy watermark
+        self.max_metrics = {}
+        self.busy = {}
+        self.busy_watermarks = {}
+
     # ----------------------
     # Private helpers
     # ----------------------
-    def _get_max_metrics(self, instance_id: str) -> tuple[float, float, float]:
-        period_seconds = 6 * 60 * 60  # 6 hours
-
-        resp = self.cw.get_metric_data(
-            MetricDataQueries=[
-                {
-                    "Id": "cpu",
-                    "MetricStat": {
-                        "Metric": {
-                            "Namespace": "AWS/EC2",
-                            "MetricName": "CPUUtilization",
-                            "Dimensions": [{"Name": "InstanceId", "Value": instance_id}],
-                        },
-                        "Period": period_seconds,
-                        "Stat": "Maximum",
-                    },
-                },
-                {
-                    "Id": "netin",
-                    "MetricStat": {
-                        "Metric": {
-                            "Namespace": "AWS/EC2",
-                            "MetricName": "NetworkIn",
-                            "Dimensions": [{"Name": "InstanceId", "Value": instance_id}],
-                        },
-                        "Period": period_seconds,
-                        "Stat": "Maximum",
-                    },
-                },
-                {
-                    "Id": "netout",
-                    "MetricStat": {
-                        "Metric": {
-                            "Namespace": "AWS/EC2",
-                            "MetricName": "NetworkOut",
-                            "Dimensions": [{"Name": "InstanceId", "Value": instance_id}],
-                        },
-                        "Period": period_seconds,
-                        "Stat": "Maximum",
-                    },
-                },
-            ],
-            StartTime=self.start_time,
-            EndTime=self.end_time,
+    def _is_old_enough(self, instance: dict) -> bool:
+        # Skip instances newer than lookback window (+1 day buffer)
+        min_age = timedelta(days=self.CONFIG.LOOKBACK_DAYS + 1)
+        return self.end_time - instance["LaunchTime"] >= min_age
+
+    def _fingerprint(self, instance: dict) -> str:
+        # The settings that decide the verdict are part of it, so changing them re-evaluates.
+        return utils.fingerprint(
+            self.CONFIG.LOOKBACK_DAYS,
+            self.CONFIG.VERDICT_THRESHOLD_MARGIN,
+            sorted(self._thresholds().items()),
+            instance["State"]["Name"],
+            instance["InstanceType"],
+            instance.get("InstanceLifecycle"),
+            instance["LaunchTime"],
+            sorted((tag["Key"], tag["Value"]) for tag in instance.get("Tags", [])),
         )
 
-        results = {r["Id"]: r.get("Values", []) for r in resp.get("MetricDataResults", [])}
-
-        cpu = max(results.get("cpu", []), default=0.0)
-        netin = max(results.get("netin", []), default=0.0)
-        netout = max(results.get("netout", []), default=0.0)
-
-        return cpu, netin, netout
+    def _thresholds(self) -> dict[str, float]:
+        return {
+            "cpu": self.CONFIG.CPU_IDLE_THRESHOLD_PERCENTAGE,
+            "netin": self.CONFIG.NET_IDLE_THRESHOLD_MB,
+            "netout": self.CONFIG.NET_IDLE_THRESHOLD_MB,
+        }
+
+    def _analyze_instances(self, instance_ids: list[str]) -> None:
+        """
+        Max CPU / network and the busy verdict of every instance in one vectorized pass
+        over the (instances x time) metric matrices.
+        """
+        maxima, busy, watermarks = [], np.zeros(len(instance_ids), dtype=bool), []
+        for label, threshold in self._thresholds().items():
+            matrix, time_axis = utils.metric_matrix(self.metrics, instance_ids, label)
+            label_max = utils.summarize_rows(matrix)["max"]
+
+            maxima.append(label_max)
+            busy |= label_max >= threshold
+
+            # Latest datapoint clearly above the threshold; the instance stays busy at
+            # least until it leaves the lookback window.
+            clear = matrix >= threshold * (1 + self.CONFIG.VERDICT_THRESHOLD_MARGIN)
+            watermarks.append(utils.last_timestamps(clear, time_axis))
+
+        for i, instance_id in enumerate(instance_ids):
+            self.max_metrics[instance_id] = tuple(label_max[i].item() for label_max in maxima)
+            self.busy[instance_id] = bool(busy[i])
+            self.busy_watermarks[instance_id] = max((ts[i] for ts in watermarks if ts[i]), default=None)
 
     # -------------------------------
     # Required BasePipeline methods
     # -------------------------------
     def fetch_items(self):
         logger.info("Fetching EC2 instances.")
-        paginator = self.ec2.get_paginator("describe_instances")
+        inventory = utils.get_ec2_inventory(self.ec2, self.account_id, self.region)
 
-        instances = []
-        for page in paginator.paginate():
-            for reservation in page.get("Reservations", []):
-                for instance in reservation.get("Instances", []):
-                    state = instance.get("State", {}).get("Name")
-                    if state in {"terminated", "shutting-down", "stopping", "stopped"}:
-                        continue
+        return [
+            instance
+            for instance in inventory.instances.values()
+            if instance.get("State", {}).get("Name") not in {"terminated", "shutting-down", "stopping", "stopped"}
+        ]
 
-                    instances.append(instance)
+    def prefetch(self, instances: list[dict]):
+        period_seconds = 6 * 60 * 60  # 6 hours
+        instance_ids = [
+            instance["InstanceId"]
+            for instance in instances
+            if instance["State"]["Name"] == "running" and self._is_old_enough(instance)
+        ]
 
-        return instances
+        fingerprints = {instance["InstanceId"]: self._fingerprint(instance) for instance in instances}
+        self.load_verdicts({instance_id: fingerprints[instance_id] for instance_id in instance_ids})
+        instance_ids = [instance_id for instance_id in instance_ids if instance_id not in self.verdicts]
+
+        if self.use_metrics_insights():
+            # Lowest maxima first: instances left out past the busy threshold need no metrics.
+            results, instance_ids, busy_ids = utils.fetch_grouped_metrics(
+                self.cw,
+                {
+                    label: f'SELECT MAX({metric_name}) FROM SCHEMA("AWS/EC2", InstanceId) '
+                           f'GROUP BY InstanceId ORDER BY MAX() ASC'
+                    for label, metric_name in self.METRICS.items()
+                },
+                instance_ids,
+                self.start_time,
+                self.end_time,
+                period_seconds,
+                self._thresholds(),
+            )
+            self.metrics.update(results)
+            for instance_id in busy_ids:
+                self.busy[instance_id] = True
+                self.busy_watermarks[instance_id] = None
+
+        batcher = self.metric_batcher(self.start_time, self.end_time)
+
+        for instance_id in instance_ids:
+            dimensions = [{"Name": "InstanceId", "Value": instance_id}]
+            for label, metric_name in self.METRICS.items():
+                batcher.add(instance_id, label, "AWS/EC2", metric_name, dimensions, period_seconds, "Maximum")
+
+        self.metrics.update(batcher.execute())
+        self._analyze_instances(list(self.metrics))
 
     def process_item(self, instance: dict) -> bool:
         instance_id = instance["InstanceId"]
         state = instance["State"]["Name"].upper()
         launch_time = instance["LaunchTime"]
 
-        # Skip instances newer than lookback window (+1 day buffer)
-        min_age = timedelta(days=self.CONFIG.LOOKBACK_DAYS + 1)
-        if self.end_time - launch_time < min_age:
+        if not self._is_old_enough(instance):
             return False
 
+        if instance_id in self.verdicts:
+            return self.replay_row(self.verdicts[instance_id])
+
         name = next((t["Value"] for t in instance.get("Tags", []) if t["Key"] == "Name"), "")
         lifecycle = instance.get("InstanceLifecycle", "on-demand")
         instance_type = instance["InstanceType"]
@@ -118,13 +155,10 @@ class EC2UnusedPipeline(BasePipeline):
         max_cpu = max_net_in = max_net_out = 0.0
 
         if state == "RUNNING":
-            max_cpu, max_net_in, max_net_out = self._get_max_metrics(instance_id)
+            max_cpu, max_net_in, max_net_out = self.max_metrics.get(instance_id, (0.0, 0.0, 0.0))
 
-            if (
-                max_cpu >= self.CONFIG.CPU_IDLE_THRESHOLD_PERCENTAGE
-                or max_net_in >= self.CONFIG.NET_IDLE_THRESHOLD_MB
-                or max_net_out >= self.CONFIG.NET_IDLE_THRESHOLD_MB
-            ):
+            if self.busy.get(instance_id):
+                self.record_verdict(instance_id, self._fingerprint(instance), None, self.busy_watermarks[instance_id])
                 return False
 
         status = "IDLE" if state == "RUNNING" else state
@@ -147,5 +181,5 @@ class EC2UnusedPipeline(BasePipeline):
             round(hourly_price, 4),
         ]
 
-        utils.write_to_csv(self.CONFIG.OUTPUT_CSV, row, mode="a")
+        self.add_result(row)
         return True
@@ -10,28 +10,27 @@ from pipelines.base import BasePipeline
 class EIPUnusedPipeline(BasePipeline):
     CONFIG = EIPUnusedConfig
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, account_id: str = None, region: str = None, results: utils.ResultSink = None):
+        super().__init__(account_id, region, results)
 
         # Clients
-        session = utils.create_boto3_session()
-        self.ec2 = session.client("ec2")
+        self.ec2 = utils.get_client("ec2", self.region, self.account_id)
+        self.inventory = None
 
     # ----------------------
     # Private helpers
     # ----------------------
     def _is_attached_to_running_instance(self, instance_id: str) -> bool:
-        response = self.ec2.describe_instances(InstanceIds=[instance_id])
-        instance = response["Reservations"][0]["Instances"][0]
-        return instance["State"]["Name"] == "running"
+        instance = self.inventory.instances.get(instance_id)
+        return instance is not None and instance["State"]["Name"] == "running"
 
     # -------------------------------
     # Required BasePipeline methods
     # -------------------------------
     def fetch_items(self):
         logger.info("Fetching Elastic IPs.")
-        response = self.ec2.describe_addresses()
-        return response.get("Addresses", [])
+        self.inventory = utils.get_ec2_inventory(self.ec2, self.account_id, self.region)
+        return self.inventory.addresses
 
     def process_item(self, eip: dict) -> bool:
         instance_id = eip.get("InstanceId")
@@ -46,6 +45,11 @@ class EIPUnusedPipeline(BasePipeline):
         if instance_id and self._is_attached_to_running_instance(instance_id):
             return False
 
-        row = [eip["PublicIp"], eip["AllocationId"]]
-        utils.write_to_csv(self.CONFIG.OUTPUT_CSV, row, mode="a")
+        monthly_cost = (
+            utils.monthly_usage_cost("AmazonVPC", self.region, "PublicIPv4:IdleAddress", 1, hourly=True)
+            or utils.monthly_usage_cost("AmazonEC2", self.region, "ElasticIP:IdleAddress", 1, hourly=True)
+        )
+
+        row = [eip["PublicIp"], eip["AllocationId"], round(monthly_cost, 2)]
+        self.add_result(row)
         return True
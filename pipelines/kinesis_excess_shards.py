@@ -1,3 +1,4 @@
+import numpy as np
 from typing import Any
 from datetime import datetime, timedelta, timezone
 
@@ -13,19 +14,21 @@ from settings import KinesisExcessShardsConfig
 class KinesisExcessShardsPipeline(BasePipeline):
     CONFIG = KinesisExcessShardsConfig
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, account_id: str = None, region: str = None, results: utils.ResultSink = None):
+        super().__init__(account_id, region, results)
 
         # Clients
-        session = utils.create_boto3_session()
-        self.kinesis = session.client("kinesis")
-        self.cw = session.client("cloudwatch")
+        self.kinesis = utils.get_client("kinesis", self.region, self.account_id)
+        self.cw = utils.get_client("cloudwatch", self.region, self.account_id)
 
         # Time range
         self.period_seconds = 12 * 60 * 60
         self.end_time = datetime.now(timezone.utc)
         self.start_time = self.end_time - timedelta(days=self.CONFIG.LOOKBACK_DAYS)
 
+        # Traffic statistics: stream name -> {avg_write_mbps, ..., traffic_pattern}
+        self.stream_stats = {}
+
     # ----------------------
     # Private helpers
     # ----------------------
@@ -52,109 +55,55 @@ class KinesisExcessShardsPipeline(BasePipeline):
             return 0
         return int(summary.get("OpenShardCount", 0))
 
-    def _get_stream_level_metric_series(self, stream_name: str) -> dict[str, list[float]]:
-        """
-        Monthly lookback, 12-hour datapoints.
-        - Read bytes: OutgoingBytes
-        - Write bytes: IncomingBytes
-        - Iterator age: GetRecords.IteratorAgeMilliseconds
+    def _classify_traffic_patterns(self, avg_write_mbps: np.ndarray, max_write_mbps: np.ndarray,
+                                   avg_read_mbps: np.ndarray, max_read_mbps: np.ndarray) -> np.ndarray:
         """
-        resp = self.cw.get_metric_data(
-            MetricDataQueries=[
-                {
-                    "Id": "incoming",
-                    "MetricStat": {
-                        "Metric": {
-                            "Namespace": "AWS/Kinesis",
-                            "MetricName": "IncomingBytes",
-                            "Dimensions": [{"Name": "StreamName", "Value": stream_name}],
-                        },
-                        "Period": self.period_seconds,
-                        "Stat": "Sum",
-                    },
-                    "ReturnData": True,
-                },
-                {
-                    "Id": "read_bytes",
-                    "MetricStat": {
-                        "Metric": {
-                            "Namespace": "AWS/Kinesis",
-                            "MetricName": "GetRecords.Bytes",
-                            "Dimensions": [{"Name": "StreamName", "Value": stream_name}],
-                        },
-                        "Period": self.period_seconds,
-                        "Stat": "Sum",
-                    },
-                    "ReturnData": True,
-                },
-                {
-                    "Id": "iterator_age",
-                    "MetricStat": {
-                        "Metric": {
-                            "Namespace": "AWS/Kinesis",
-                            "MetricName": "GetRecords.IteratorAgeMilliseconds",
-                            "Dimensions": [{"Name": "StreamName", "Value": stream_name}],
-                        },
-                        "Period": self.period_seconds,
-                        "Stat": "Maximum",
-                    },
-                    "ReturnData": True,
-                },
-            ],
-            StartTime=self.start_time,
-            EndTime=self.end_time,
-            ScanBy="TimestampAscending",
-        )
-
-        results = {r["Id"]: r.get("Values", []) for r in resp.get("MetricDataResults", [])}
-        return {
-            "incoming_bytes": results.get("incoming", []),
-            "read_bytes": results.get("read_bytes", []),
-            "iterator_age_ms": results.get("iterator_age", []),
-        }
-
-    def _bytes_to_avg_mb_per_sec(self, datapoints_sum_bytes: list[float]) -> float:
-        if not datapoints_sum_bytes:
-            return 0.0
-
-        mbps_values = [(b / (1024 * 1024)) / self.period_seconds for b in datapoints_sum_bytes]
-        return sum(mbps_values) / len(mbps_values)
-
-    def _bytes_to_max_mb_per_sec(self, datapoints_sum_bytes: list[float]) -> float:
-        if not datapoints_sum_bytes:
-            return 0.0
-        max_bytes = max(datapoints_sum_bytes)
-        return (max_bytes / (1024 * 1024)) / self.period_seconds
-
-    def _bytes_to_total_gb(self, datapoints_sum_bytes: list[float]) -> float:
-        if not datapoints_sum_bytes:
-            return 0.0
-        return sum(datapoints_sum_bytes) / (1024 ** 3)
-
-    def _max_iterator_age_seconds(self, iterator_age_ms_points: list[float]) -> float:
-        if not iterator_age_ms_points:
-            return 0.0
-        return max(iterator_age_ms_points) / 1000.0
-
-    def _classify_traffic_pattern(self, avg_write_mbps: float, max_write_mbps: float,
-                                  avg_read_mbps: float, max_read_mbps: float) -> str:
-        """
-        Simple, explainable classifier:
+        Simple, explainable classifier (one label per stream):
         - IDLE: basically no traffic
         - CONSISTENT: spikes not much higher than average
         - SPIKY: max >> avg (burst workloads)
         """
-        avg = max(avg_write_mbps, avg_read_mbps)
-        peak = max(max_write_mbps, max_read_mbps)
-
-        if peak < 0.01 and avg < 0.005:
-            return "IDLE"
+        avg = np.maximum(avg_write_mbps, avg_read_mbps)
+        peak = np.maximum(max_write_mbps, max_read_mbps)
 
         # Ratio-based spike detection
-        if avg > 0 and (peak / avg) >= 5:
-            return "SPIKY"
+        peak_to_avg = np.divide(peak, avg, out=np.zeros_like(peak), where=avg > 0)
 
-        return "CONSISTENT"
+        return np.select(
+            [(peak < 0.01) & (avg < 0.005), peak_to_avg >= 5],
+            ["IDLE", "SPIKY"],
+            default="CONSISTENT",
+        )
+
+    def _analyze_streams(self, stream_names: list[str]) -> None:
+        """
+        Computes every stream's traffic statistics in one vectorized pass over the
+        (streams x time) metric matrices.
+        """
+        bytes_per_mb = 1024 * 1024
+
+        incoming = utils.summarize_rows(utils.metric_matrix(self.metrics, stream_names, "incoming")[0])
+        read_bytes = utils.summarize_rows(utils.metric_matrix(self.metrics, stream_names, "read_bytes")[0])
+        iterator_age = utils.summarize_rows(utils.metric_matrix(self.metrics, stream_names, "iterator_age")[0])
+
+        avg_write_mbps = incoming["mean"] / bytes_per_mb / self.period_seconds
+        avg_read_mbps = read_bytes["mean"] / bytes_per_mb / self.period_seconds
+        max_write_mbps = incoming["max"] / bytes_per_mb / self.period_seconds
+        max_read_mbps = read_bytes["max"] / bytes_per_mb / self.period_seconds
+
+        stats = {
+            "avg_write_mbps": avg_write_mbps,
+            "avg_read_mbps": avg_read_mbps,
+            "max_write_mbps": max_write_mbps,
+            "max_read_mbps": max_read_mbps,
+            "total_write_gb": incoming["sum"] / (1024 ** 3),
+            "total_read_gb": read_bytes["sum"] / (1024 ** 3),
+            "max_iterator_age_sec": iterator_age["max"] / 1000.0,
+            "traffic_pattern": self._classify_traffic_patterns(avg_write_mbps, max_write_mbps, avg_read_mbps, max_read_mbps),
+        }
+
+        for i, stream_name in enumerate(stream_names):
+            self.stream_stats[stream_name] = {name: values[i].item() for name, values in stats.items()}
 
     # -------------------------------
     # Required BasePipeline methods
@@ -163,50 +112,52 @@ class KinesisExcessShardsPipeline(BasePipeline):
         logger.info("Fetching Kinesis streams.")
         return self._list_stream_names()
 
+    def prefetch(self, stream_names: list[str]):
+        """
+        Monthly lookback, 12-hour datapoints.
+        - Read bytes: OutgoingBytes
+        - Write bytes: IncomingBytes
+        - Iterator age: GetRecords.IteratorAgeMilliseconds
+        """
+        batcher = self.metric_batcher(self.start_time, self.end_time)
+
+        for stream_name in stream_names:
+            dimensions = [{"Name": "StreamName", "Value": stream_name}]
+            batcher.add(stream_name, "incoming", "AWS/Kinesis", "IncomingBytes", dimensions, self.period_seconds, "Sum")
+            batcher.add(stream_name, "read_bytes", "AWS/Kinesis", "GetRecords.Bytes", dimensions, self.period_seconds, "Sum")
+            batcher.add(
+                stream_name, "iterator_age", "AWS/Kinesis", "GetRecords.IteratorAgeMilliseconds",
+                dimensions, self.period_seconds, "Maximum",
+            )
+
+        self.metrics.update(batcher.execute())
+        self._analyze_streams(stream_names)
+
     def process_item(self, stream_name: str) -> bool:
         summary = self._describe_stream_summary(stream_name)
+        self.add_result(self._build_row(stream_name, summary))
+        return True
 
+    def _build_row(self, stream_name: str, summary: dict[str, Any]) -> list:
         mode = self._get_stream_mode(summary)
         retention_hours = self._get_retention_hours(summary)
         shard_count = self._get_provisioned_open_shard_count(summary, mode)
-        metric_series = self._get_stream_level_metric_series(stream_name)
-
-        incoming_bytes = metric_series["incoming_bytes"]
-        read_bytes = metric_series["read_bytes"]
-        iterator_age_ms = metric_series["iterator_age_ms"]
-
-        avg_write_mbps = self._bytes_to_avg_mb_per_sec(incoming_bytes)
-        avg_read_mbps = self._bytes_to_avg_mb_per_sec(read_bytes)
-
-        max_write_mbps = self._bytes_to_max_mb_per_sec(incoming_bytes)
-        max_read_mbps = self._bytes_to_max_mb_per_sec(read_bytes)
-
-        total_monthly_write_gb = self._bytes_to_total_gb(incoming_bytes)
-        total_monthly_read_gb = self._bytes_to_total_gb(read_bytes)
-
-        max_iterator_age_sec = self._max_iterator_age_seconds(iterator_age_ms)
-
-        traffic_pattern = self._classify_traffic_pattern(
-            avg_write_mbps=avg_write_mbps,
-            max_write_mbps=max_write_mbps,
-            avg_read_mbps=avg_read_mbps,
-            max_read_mbps=max_read_mbps,
-        )
+        stats = self.stream_stats[stream_name]
 
         row = [
             stream_name,
             mode,
-            traffic_pattern,
+            stats["traffic_pattern"],
             shard_count,
             retention_hours,
-            round(avg_read_mbps, 4),
-            round(avg_write_mbps, 4),
-            round(max_read_mbps, 4),
-            round(max_write_mbps, 4),
-            round(total_monthly_read_gb, 2),
-            round(total_monthly_write_gb, 2),
-            round(max_iterator_age_sec, 2),
+            round(stats["avg_read_mbps"], 4),
+            round(stats["avg_write_mbps"], 4),
+            round(stats["max_read_mbps"], 4),
+            round(stats["max_write_mbps"], 4),
+            round(stats["total_read_gb"], 2),
+            round(stats["total_write_gb"], 2),
+            round(stats["max_iterator_age_sec"], 2),
+            round(utils.monthly_usage_cost("AmazonKinesis", self.region, "Storage-ShardHour", shard_count, hourly=True), 2),
         ]
 
-        utils.write_to_csv(self.CONFIG.OUTPUT_CSV, row, mode="a")
-        return True
+        return row
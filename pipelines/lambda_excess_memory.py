@@ -1,5 +1,5 @@
-import time
-from datetime import datetime, timedelta, timezone
+import hashlib
+from datetime import datetime, timedelta, timezone, time as dt_time
 
 # ----------------------
 # Custom Imports
@@ -12,69 +12,181 @@ from pipelines.base import BasePipeline
 
 class LambdaExcessMemoryPipeline(BasePipeline):
     CONFIG = LambdaExcessMemoryConfig
+    LOG_GROUP_PREFIXES = ["/aws/lambda/", "/lambda/"]
+    REPORT_QUERY = """
+        filter @message like /REPORT RequestId/
+        | parse @message /Billed Duration: (?<billed>[0-9.]+) ms/
+        | parse @message /Max Memory Used: (?<memory>[0-9.]+) MB/
+        | stats
+            sum(billed) as sum_billed,
+            count(billed) as count_billed,
+            sum(memory) as sum_memory,
+            count(memory) as count_memory,
+            max(memory) as max_memory
+          by @log
+        """
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, account_id: str = None, region: str = None, results: utils.ResultSink = None):
+        super().__init__(account_id, region, results)
 
         # Clients
-        session = utils.create_boto3_session()
-        self.lambda_client = session.client("lambda")
-        self.cw = session.client("cloudwatch")
-        self.logs = session.client("logs")
+        self.lambda_client = utils.get_client("lambda", self.region, self.account_id)
+        self.cw = utils.get_client("cloudwatch", self.region, self.account_id)
+        self.logs = utils.get_client("logs", self.region, self.account_id)
+        self.query_manager = utils.get_logs_query_manager(self.logs, self.account_id)
 
         # Time range
         self.end_time = datetime.now(timezone.utc)
         self.invocation_start_time = self.end_time - timedelta(days=self.CONFIG.INVOCATION_LOOKBACK_DAYS)
         self.logs_insights_start_time = self.end_time - timedelta(days=self.CONFIG.LOGS_INSIGHTS_LOOKBACK_DAYS)
 
+        # Logs Insights metrics: function name -> {avg_billed, avg_memory, max_memory}
+        self.logs_metrics = {}
+
+        # Lambda log group names, listed once per unit (prefetch runs once per streamed chunk)
+        self.log_group_names = None
+
+        # Daily partial aggregates, scoped to the account, region and the exact query text
+        self.daily_cache = utils.DailyPartialsCache(self.CONFIG.LOGS_INSIGHTS_CACHE_PATH)
+        query_fingerprint = hashlib.sha1(self.REPORT_QUERY.encode()).hexdigest()[:12]
+        self.cache_namespace = f"{self.account_id}:{self.region}:{query_fingerprint}"
+
     # ----------------------
     # Private helpers
     # ----------------------
     def _get_invocations(self, function_name: str) -> int:
-        resp = self.cw.get_metric_statistics(
-            Namespace="AWS/Lambda",
-            MetricName="Invocations",
-            Dimensions=[{"Name": "FunctionName", "Value": function_name}],
-            StartTime=self.invocation_start_time,
-            EndTime=self.end_time,
-            Period=3600,
-            Statistics=["Sum"],
-        )
-        return int(sum(dp["Sum"] for dp in resp.get("Datapoints", [])))
+        return int(sum(self.metric_values(function_name, "invocations")))
 
-    def _get_logs_metrics(self, log_group: str) -> dict:
-        query = """
-        filter @message like /REPORT RequestId/
-        | parse @message /Billed Duration: (?<billed>[0-9.]+) ms/
-        | parse @message /Max Memory Used: (?<memory>[0-9.]+) MB/
-        | stats
-            avg(billed) as avg_billed,
-            avg(memory) as avg_memory,
-            max(memory) as max_memory
+    def _list_log_group_names(self) -> set[str]:
+        if self.log_group_names is not None:
+            return self.log_group_names
+
+        paginator = self.logs.get_paginator("describe_log_groups")
+
+        log_group_names = set()
+        for prefix in self.LOG_GROUP_PREFIXES:
+            for page in paginator.paginate(logGroupNamePrefix=prefix):
+                log_group_names.update(lg["logGroupName"] for lg in page.get("logGroups", []))
+
+        self.log_group_names = log_group_names
+        return log_group_names
+
+    def _parse_logs_metrics(self, rows: list[list[dict]]) -> dict[str, dict]:
+        metrics = {}
+        for row in rows:
+            fields = {item["field"]: item["value"] for item in row}
+
+            # @log is "<account id>:<log group name>"
+            log_group = fields.pop("@log", "").split(":", 1)[-1]
+            metrics[log_group] = {field: float(value) for field, value in fields.items() if not field.startswith("@")}
+
+        return metrics
+
+    def _run_windows(self, windows: list[tuple[datetime, datetime, list[str]]]):
         """
+        Runs one Logs Insights query per LOGS_INSIGHTS_MAX_LOG_GROUPS log groups and per
+        window through the shared query manager.
 
-        try:
-            resp = self.logs.start_query(
-                logGroupName=log_group,
-                startTime=int(self.logs_insights_start_time.timestamp()),
-                endTime=int(self.end_time.timestamp()),
-                queryString=query,
-            )
-        except self.logs.exceptions.ResourceNotFoundException:
-            return {}
+        Yields (window_start, log_groups, {log_group: partial}), with None instead of the
+        partials when the query failed; the stats of those log groups then miss the
+        window, which is logged.
+        """
+        batch_size = self.CONFIG.LOGS_INSIGHTS_MAX_LOG_GROUPS
+
+        tasks = []
+        for window_start, window_end, log_groups in windows:
+            for i in range(0, len(log_groups), batch_size):
+                batch = log_groups[i:i + batch_size]
+                future = self.query_manager.submit(self.REPORT_QUERY, batch, window_start, window_end)
+                tasks.append((window_start, window_end, batch, future))
+
+        for window_start, window_end, batch, future in tasks:
+            try:
+                yield window_start, batch, self._parse_logs_metrics(future.result())
+            except Exception as e:
+                logger.warning(
+                    f"[{self.pipeline_name}] Logs Insights query failed, the stats of {len(batch)} log groups "
+                    f"miss {window_start:%Y-%m-%d %H:%M:%S} to {window_end:%Y-%m-%d %H:%M:%S} UTC: {e}."
+                )
+                yield window_start, batch, None
+
+    def _get_days(self) -> list[tuple[str, datetime, datetime, bool]]:
+        """
+        UTC days covering the Logs Insights lookback as (day, start, end, closed). A day
+        is closed, and cacheable, once it ended LOGS_INSIGHTS_CACHE_SETTLE_HOURS ago.
+        """
+        settled_until = self.end_time - timedelta(hours=self.CONFIG.LOGS_INSIGHTS_CACHE_SETTLE_HOURS)
+        day_start = datetime.combine(self.logs_insights_start_time.date(), dt_time.min, tzinfo=timezone.utc)
+
+        days = []
+        while day_start <= self.end_time:
+            day_end = day_start + timedelta(days=1)
+            window_end = min(day_end - timedelta(seconds=1), self.end_time)
+            days.append((day_start.date().isoformat(), day_start, window_end, day_end <= settled_until))
+            day_start = day_end
+
+        return days
+
+    def _query_log_groups(self, log_groups: list[str]) -> dict[str, dict]:
+        """
+        Queries the REPORT stats of the given log groups in parallel time slices and
+        merges the partial aggregates back into one result per log group.
+        """
+        if self.CONFIG.LOGS_INSIGHTS_DAILY_CACHE:
+            return self._query_log_groups_cached(log_groups)
+
+        time_slices = utils.split_time_range(
+            self.logs_insights_start_time, self.end_time, self.CONFIG.LOGS_INSIGHTS_TIME_SLICES
+        )
+
+        partials = {}
+        for _, _, results in self._run_windows([(start, end, log_groups) for start, end in time_slices]):
+            for log_group, partial in (results or {}).items():
+                partials.setdefault(log_group, []).append(partial)
 
-        query_id = resp["queryId"]
+        return {log_group: utils.merge_partial_aggregates(parts) for log_group, parts in partials.items()}
 
-        while True:
-            result = self.logs.get_query_results(queryId=query_id)
-            if result["status"] == "Complete":
-                break
-            time.sleep(1)
+    def _query_log_groups_cached(self, log_groups: list[str]) -> dict[str, dict]:
+        """
+        Same as _query_log_groups, but sliced per UTC day: closed days come from the
+        daily cache and only missing or still-open days are queried.
+        """
+        days = self._get_days()
+        closed_days = {day for day, _, _, closed in days if closed}
+        partials = self.daily_cache.get(self.cache_namespace, sorted(closed_days))
+
+        windows = []
+        for day, day_start, day_end, closed in days:
+            missing = [log_group for log_group in log_groups if not closed or (log_group, day) not in partials]
+            if missing:
+                windows.append((day_start, day_end, missing))
+
+        queried, failed = {}, 0
+        for window_start, batch, results in self._run_windows(windows):
+            if results is None:
+                failed += len(batch)
+                continue
+            day = window_start.date().isoformat()
+            for log_group in batch:
+                queried[(log_group, day)] = results.get(log_group, {})
+
+        self.daily_cache.put(self.cache_namespace, {key: value for key, value in queried.items() if key[1] in closed_days})
+        self.daily_cache.prune(self.cache_namespace, days[0][0])
+        partials.update(queried)
+
+        logger.info(
+            f"[{self.pipeline_name}] Logs Insights: queried {len(queried)} of "
+            f"{len(log_groups) * len(days)} log group days and {failed} failed, "
+            f"the rest came from the cache."
+        )
 
-        if not result.get("results"):
-            return {}
+        merged = {}
+        for log_group in log_groups:
+            parts = [partials[(log_group, day)] for day, *_ in days if partials.get((log_group, day))]
+            if parts:
+                merged[log_group] = utils.merge_partial_aggregates(parts)
 
-        return {item["field"]: float(item["value"]) for item in result["results"][0]}
+        return merged
 
     # -------------------------------
     # Required BasePipeline methods
@@ -83,17 +195,35 @@ class LambdaExcessMemoryPipeline(BasePipeline):
         logger.info("Fetching Lambda functions.")
         paginator = self.lambda_client.get_paginator("list_functions")
 
-        lambdas = []
         for page in paginator.paginate():
             for fn in page.get("Functions", []):
-                lambdas.append(
-                    {
-                        "name": fn["FunctionName"],
-                        "memory": fn["MemorySize"],
-                    }
-                )
-
-        return lambdas
+                yield {
+                    "name": fn["FunctionName"],
+                    "memory": fn["MemorySize"],
+                }
+
+    def prefetch(self, lambdas: list[dict]):
+        batcher = self.metric_batcher(self.invocation_start_time, self.end_time)
+
+        for fn in lambdas:
+            dimensions = [{"Name": "FunctionName", "Value": fn["name"]}]
+            batcher.add(fn["name"], "invocations", "AWS/Lambda", "Invocations", dimensions, 3600, "Sum")
+
+        self.metrics.update(batcher.execute())
+
+        # Logs Insights: /aws/lambda/{name} first, /lambda/{name} for functions without REPORT lines there.
+        existing = self._list_log_group_names()
+        names = [fn["name"] for fn in lambdas]
+
+        for prefix in self.LOG_GROUP_PREFIXES:
+            pending = {
+                f"{prefix}{name}": name
+                for name in names
+                if name not in self.logs_metrics and f"{prefix}{name}" in existing
+            }
+            for log_group, metrics in self._query_log_groups(list(pending)).items():
+                if log_group in pending:
+                    self.logs_metrics[pending[log_group]] = metrics
 
     def process_item(self, fn: dict) -> bool:
         name = fn["name"]
@@ -102,9 +232,7 @@ class LambdaExcessMemoryPipeline(BasePipeline):
         try:
             invocations = self._get_invocations(name)
 
-            logs_metrics = self._get_logs_metrics(f"/aws/lambda/{name}")
-            if not logs_metrics:
-                logs_metrics = self._get_logs_metrics(f"/lambda/{name}")
+            logs_metrics = self.logs_metrics.get(name, {})
 
             avg_billed_seconds = round(logs_metrics.get("avg_billed", 0) / 1000, 2)
             avg_memory = int(logs_metrics.get("avg_memory", 0))
@@ -112,7 +240,7 @@ class LambdaExcessMemoryPipeline(BasePipeline):
 
             row = [name, memory, invocations, avg_billed_seconds, avg_memory, max_memory]
 
-            utils.write_to_csv(self.CONFIG.OUTPUT_CSV, row, mode="a")
+            self.add_result(row)
             return True
 
         except Exception as e:
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+
+# ----------------------
+# Custom Imports
+# ----------------------
+import utils
+from utils import logger
+from settings import LogsScanConfig
+from pipelines.base import BasePipeline
+
+
+class LogsScan:
+    """
+    Every log group of one account and region with its IncomingBytes summed over
+    LogsScanConfig.LOOKBACK_DAYS, listed and fetched once per run.
+    """
+
+    def __init__(self, log_groups: list[dict], ingested_bytes: dict[str, int]):
+        self.log_groups = log_groups
+        self.ingested_bytes = ingested_bytes
+
+
+class LogsScanPipeline(BasePipeline):
+    """
+    Base of the Logs pipelines. The first one to run in a run builds the LogsScan
+    snapshot, the others load it; each only selects its log groups and builds rows.
+    """
+
+    CONFIG = LogsScanConfig
+
+    def __init__(self, account_id: str = None, region: str = None, results: utils.ResultSink = None):
+        super().__init__(account_id, region, results)
+
+        # Clients
+        self.logs = utils.get_client("logs", self.region, self.account_id)
+        self.cw = utils.get_client("cloudwatch", self.region, self.account_id)
+
+        self.scan = None
+
+    # ----------------------
+    # Private helpers
+    # ----------------------
+    def _build_scan(self) -> LogsScan:
+        logger.info(f"Scanning CloudWatch Log Groups [{self.account_id}/{self.region}].")
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(days=LogsScanConfig.LOOKBACK_DAYS)
+
+        paginator = self.logs.get_paginator("describe_log_groups")
+        log_groups = [lg for page in paginator.paginate() for lg in page.get("logGroups", [])]
+        log_group_names = [lg["logGroupName"] for lg in log_groups]
+
+        batcher = self.metric_batcher(start_time, end_time)
+
+        for log_group_name in log_group_names:
+            dimensions = [{"Name": "LogGroupName", "Value": log_group_name}]
+            batcher.add(log_group_name, "incoming_bytes", "AWS/Logs", "IncomingBytes", dimensions, 86400, "Sum")
+
+        metrics = batcher.execute()
+
+        ingested_bytes = {
+            name: int(sum(series["incoming_bytes"].values))
+            for name, series in metrics.items()
+            if "incoming_bytes" in series
+        }
+        return LogsScan(log_groups, ingested_bytes)
+
+    def get_monthly_ingested_bytes(self, log_group_name: str) -> int:
+        return self.scan.ingested_bytes.get(log_group_name, 0)
+
+    def select_log_groups(self, log_groups: list[dict]) -> list[dict]:
+        return log_groups
+
+    # -------------------------------
+    # Required BasePipeline methods
+    # -------------------------------
+    def fetch_items(self):
+        self.scan = utils.load_run_snapshot(f"logs-{self.account_id}-{self.region}", self._build_scan)
+        return self.select_log_groups(self.scan.log_groups)
@@ -11,14 +11,18 @@ from pipelines.base import BasePipeline
 
 class NATUnusedPipeline(BasePipeline):
     CONFIG = NATUnusedConfig
+    METRICS_TO_CHECK = [
+        "ActiveConnectionCount",
+        "BytesOutToDestination",
+        "BytesInFromDestination",
+    ]
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, account_id: str = None, region: str = None, results: utils.ResultSink = None):
+        super().__init__(account_id, region, results)
 
         # Clients
-        session = utils.create_boto3_session()
-        self.ec2 = session.client("ec2")
-        self.cw = session.client("cloudwatch")
+        self.ec2 = utils.get_client("ec2", self.region, self.account_id)
+        self.cw = utils.get_client("cloudwatch", self.region, self.account_id)
 
         # Time range
         self.end_time = datetime.now(timezone.utc)
@@ -29,7 +33,23 @@ class NATUnusedPipeline(BasePipeline):
     # -------------------------------
     def fetch_items(self):
         logger.info("Fetching all NAT Gateways.")
-        return self.ec2.describe_nat_gateways().get("NatGateways", [])
+        paginator = self.ec2.get_paginator("describe_nat_gateways")
+
+        nats = []
+        for page in paginator.paginate(Filter=self.fetch_filters("describe_nat_gateways")):
+            nats.extend(page.get("NatGateways", []))
+
+        return nats
+
+    def prefetch(self, nats: list[dict]):
+        batcher = self.metric_batcher(self.start_time, self.end_time)
+
+        for nat in nats:
+            dimensions = [{"Name": "NatGatewayId", "Value": nat["NatGatewayId"]}]
+            for metric_name in self.METRICS_TO_CHECK:
+                batcher.add(nat["NatGatewayId"], metric_name, "AWS/NATGateway", metric_name, dimensions, 86400, "Sum")
+
+        self.metrics.update(batcher.execute())
 
     def process_item(self, nat: dict) -> bool:
         nat_id = nat["NatGatewayId"]
@@ -43,34 +63,18 @@ class NATUnusedPipeline(BasePipeline):
             nat["State"],
             nat.get("SubnetId", "N/A"),
             nat["CreateTime"].strftime("%Y-%m-%d %H:%M:%S"),
+            round(utils.monthly_usage_cost("AmazonEC2", self.region, "NatGateway-Hours", 1, hourly=True), 2),
         ]
 
-        utils.write_to_csv(self.CONFIG.OUTPUT_CSV, row, mode="a")
+        self.add_result(row)
         return True
 
     # -------------------------------
     # Private helpers
     # -------------------------------
     def _is_nat_idle(self, nat_id: str) -> bool:
-        metrics_to_check = [
-            "ActiveConnectionCount",
-            "BytesOutToDestination",
-            "BytesInFromDestination",
-        ]
-
-        for metric_name in metrics_to_check:
-            resp = self.cw.get_metric_statistics(
-                Namespace="AWS/NATGateway",
-                MetricName=metric_name,
-                Dimensions=[{"Name": "NatGatewayId", "Value": nat_id}],
-                StartTime=self.start_time,
-                EndTime=self.end_time,
-                Period=86400,
-                Statistics=["Sum"],
-            )
-
-            for dp in resp.get("Datapoints", []):
-                if dp.get("Sum", 0) > 0:
-                    return False
+        for metric_name in self.METRICS_TO_CHECK:
+            if any(v > 0 for v in self.metric_values(nat_id, metric_name)):
+                return False
 
         return True
@@ -1,6 +1,4 @@
 from datetime import datetime, timezone
-from botocore.exceptions import ClientError
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # ----------------------
 # Custom Imports
@@ -8,34 +6,54 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import utils
 from utils import logger
 from settings import SnapshotOldConfig
+from pipelines.base import BasePipeline
 
 
-class SnapshotOldPipeline:
-    def __init__(self):
+class SnapshotOldPipeline(BasePipeline):
+    CONFIG = SnapshotOldConfig
+
+    def __init__(self, account_id: str = None, region: str = None, results: utils.ResultSink = None):
+        super().__init__(account_id, region, results)
 
         # Clients
-        session = utils.create_boto3_session()
-        self.ec2 = session.client("ec2")
+        self.ec2 = utils.get_client("ec2", self.region, self.account_id)
+        self.inventory = None
 
         # Time range
-        self.cutoff = datetime.fromisoformat(SnapshotOldConfig.SNAPSHOT_CUTOFF_DATE).replace(tzinfo=timezone.utc)
-
-        # Writing headers
-        utils.write_to_csv(SnapshotOldConfig.OUTPUT_CSV, SnapshotOldConfig.CSV_HEADERS, mode="w")
+        self.cutoff = datetime.fromisoformat(self.CONFIG.SNAPSHOT_CUTOFF_DATE).replace(tzinfo=timezone.utc)
 
     # ----------------------
     # Private helpers
     # ----------------------
-    def _fetch_snapshots(self):
-        response = self.ec2.describe_snapshots(OwnerIds=["self"])
-        return response.get("Snapshots", [])
-
-    def _process_snapshot(self, snap: dict):
-        snap_time = snap["StartTime"]
-
-        if snap_time >= self.cutoff:
+    def _is_old(self, snap: dict) -> bool:
+        return snap["StartTime"] < self.cutoff
+
+    def _get_attached_instance_id(self, volume: dict) -> str:
+        if volume.get("Attachments"):
+            return volume["Attachments"][0]["InstanceId"]
+        return ""
+
+    # -------------------------------
+    # Required BasePipeline methods
+    # -------------------------------
+    def fetch_items(self):
+        logger.info("Fetching snapshots.")
+        # Volumes and instances are joined from the run's inventory, so deleted volumes
+        # are simply absent.
+        self.inventory = utils.get_ec2_inventory(self.ec2, self.account_id, self.region)
+
+        # Streamed page by page; accounts can hold hundreds of thousands of snapshots.
+        # describe_snapshots has no StartTime range filter, so newer ones are dropped here
+        # before they reach the workers.
+        paginator = self.ec2.get_paginator("describe_snapshots")
+        for page in paginator.paginate(OwnerIds=["self"], Filters=self.fetch_filters("describe_snapshots")):
+            yield from (snap for snap in page.get("Snapshots", []) if self._is_old(snap))
+
+    def process_item(self, snap: dict) -> bool:
+        if not self._is_old(snap):
             return False
 
+        snap_time = snap["StartTime"]
         snapshot_id = snap["SnapshotId"]
         volume_id = snap.get("VolumeId")
         size_gb = snap.get("VolumeSize", 0)
@@ -46,28 +64,20 @@ class SnapshotOldPipeline:
         instance_id = ""
         instance_name = ""
 
-        try:
-            vol = self.ec2.describe_volumes(VolumeIds=[volume_id])["Volumes"][0]
-            volume_type = vol.get("VolumeType", "")
+        vol = self.inventory.volumes.get(volume_id) if volume_id else None
 
+        if vol is None:
+            volume_name = "DeletedVolume"
+            volume_type = "Unknown"
+            instance_id = "N/A"
+            instance_name = "N/A"
+        else:
+            volume_type = vol.get("VolumeType", "")
             volume_name = next((t["Value"] for t in vol.get("Tags", []) if t["Key"] == "Name"), "")
+            instance_id = self._get_attached_instance_id(vol)
 
-            if vol.get("Attachments"):
-                instance_id = vol["Attachments"][0]["InstanceId"]
-
-                inst = self.ec2.describe_instances(InstanceIds=[instance_id])
-                instance = inst["Reservations"][0]["Instances"][0]
-
-                instance_name = next((t["Value"] for t in instance.get("Tags", []) if t["Key"] == "Name"), "")
-
-        except ClientError as e:
-            if e.response["Error"]["Code"] == "InvalidVolume.NotFound":
-                volume_name = "DeletedVolume"
-                volume_type = "Unknown"
-                instance_id = "N/A"
-                instance_name = "N/A"
-            else:
-                raise
+            if instance_id:
+                instance_name = self.inventory.name_of(instance_id)
 
         row = [
             snapshot_id,
@@ -78,25 +88,8 @@ class SnapshotOldPipeline:
             instance_name,
             size_gb,
             snapshot_date,
+            round(utils.monthly_usage_cost("AmazonEC2", self.region, "EBS:SnapshotUsage", size_gb), 2),
         ]
 
-        utils.write_to_csv(SnapshotOldConfig.OUTPUT_CSV, row, mode="a")
+        self.add_result(row)
         return True
-
-    # ----------------------
-    # Main run function
-    # ----------------------
-    def run(self):
-        logger.info("Fetching snapshots.")
-        count = 0
-        snapshots = self._fetch_snapshots()
-        logger.info(f"Processing {len(snapshots)} snapshots.")
-
-        with ThreadPoolExecutor(max_workers=SnapshotOldConfig.MAX_WORKERS) as executor:
-            futures = [executor.submit(self._process_snapshot, snapshot) for snapshot in snapshots]
-            for future in as_completed(futures):
-                if future.result():
-                    count += 1
-
-        logger.info(f"Snapshots older than {SnapshotOldConfig.SNAPSHOT_CUTOFF_DATE}: {count}.")
-        logger.info(f"Report written to {SnapshotOldConfig.OUTPUT_CSV}.")
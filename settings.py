@@ -7,34 +7,115 @@ from pathlib import Path
 class CommonConfig:
 
     # Basic
-    MAX_WORKERS = 6
+    MAX_WORKERS = 32  # Threads per pipeline unit, mostly waiting on AWS calls (and client connection pool size).
     MAX_CPU_WORKERS = 4
     SORT_ASCENDING = True
-    AWS_REGION = "us-east-1"
+    AWS_REGION = "us-east-1"  # Home region (pricing, region discovery).
+    AWS_REGIONS = ["us-east-1"]  # Regions every pipeline scans, or "all" for every enabled region.
+    MAX_UNIT_WORKERS = 16  # (account, region) units scanned concurrently per pipeline.
     MAIN_DIR = Path(__file__).parent
     OUTPUT_CSV_DIR = MAIN_DIR / "output_files"
+    CACHE_DIR = MAIN_DIR / ".cache"
+    RESULT_SPILL_ROWS = 100_000  # Rows buffered in memory before a sorted batch is spilled to disk.
+
+    # AWS Organizations (assume a role in every member account)
+    ORGANIZATION_MODE = False
+    ORGANIZATION_ACCOUNT_IDS = []  # Empty: every ACTIVE account listed by Organizations.
+    ORGANIZATION_ROLE_NAME = "OrganizationAccountAccessRole"
+    ORGANIZATION_ROLE_SESSION_SECONDS = 3600
+
+    # Adaptive rate limiting (AIMD token buckets per service, account and region, shared by all processes)
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_INITIAL_RPS = {"ec2": 20, "cloudwatch": 20, "cloudwatch-logs": 10, "dynamodb": 20, "kinesis": 10, "lambda": 10}
+    RATE_LIMIT_DEFAULT_RPS = 10
+    RATE_LIMIT_MIN_RPS = 1
+    RATE_LIMIT_MAX_RPS = 200
+    RATE_LIMIT_INCREASE_RPS = 1.0  # Added per second of throttle-free calls.
+    RATE_LIMIT_DECREASE_FACTOR = 0.5  # Applied on throttling, at most once per second.
+
+    # Warm start (workers fork from a server that already imported boto3 and parsed these models)
+    WARM_START = True
+    WARM_START_SERVICES = ["ec2", "cloudwatch", "logs", "lambda", "dynamodb", "kinesis", "pricing", "sts"]
+
+    # boto3 clients (cached per service, account and region in each process)
+    AWS_RETRY_MODE = "adaptive"  # Only used with RATE_LIMIT_ENABLED = False; the limiter uses "standard".
+    AWS_MAX_ATTEMPTS = 8
+    AWS_CONNECT_TIMEOUT_SECONDS = 5
+    AWS_READ_TIMEOUT_SECONDS = 60
+
+    # Streaming (pipelines whose fetch_items is a generator are processed chunk by chunk while listing)
+    STREAM_CHUNK_SIZE = 1_000  # Items per prefetch() call.
+    STREAM_QUEUE_CHUNKS = 4  # Chunks listed ahead of the workers.
+    STREAM_MAX_IN_FLIGHT = 64  # Items submitted to the thread pool at any time.
+
+    # Run snapshots (resource listings materialized once per run and shared by every pipeline process)
+    RUN_SNAPSHOT_DIR = CACHE_DIR / "runs"
+    RUN_SNAPSHOT_MAX_AGE_HOURS = 24  # Left-over directories of crashed runs are removed after this.
+
+    # Server-side listing filters, per API operation. INVENTORY_FILTERS apply to the shared EC2
+    # inventory, so they may only drop resources no pipeline reads; FETCH_FILTERS are per pipeline.
+    INVENTORY_FILTERS = {
+        "describe_instances": [{"Name": "instance-state-name", "Values": ["pending", "running", "stopping", "stopped"]}],
+    }
+    FETCH_FILTERS = {}
+
+    # Logs Insights query manager (per account and region)
+    LOGS_INSIGHTS_MAX_CONCURRENT_QUERIES = 10
+    LOGS_INSIGHTS_QUERY_TIMEOUT_SECONDS = 15 * 60
+    LOGS_INSIGHTS_POLL_MIN_SECONDS = 0.5
+    LOGS_INSIGHTS_POLL_MAX_SECONDS = 5.0
+    LOGS_INSIGHTS_GET_RESULTS_TPS = 5  # GetQueryResults quota, per account and region.
 
     # Google Sheet
     WRITE_TO_GOOGLE_SHEET = True
     SPREADSHEET_NAME = "AWS Cost Watch - Platform Dev"
     GCC_JSON_PATH = MAIN_DIR / "google-sheet-creds.json"
+    SHEETS_STATE_PATH = CACHE_DIR / "sheets_state.json"  # Row hashes of the last publish.
+    SHEETS_CHUNK_ROWS = 5_000
+    SHEETS_WRITE_REQUESTS_PER_MINUTE = 50
+    SHEETS_MAX_RETRIES = 6
+    SHEETS_MAX_CELLS_PER_WORKSHEET = 2_000_000  # Larger reports roll over into "<name> (2)", "<name> (3)", ...
+    SHEETS_MAX_CELLS_PER_SPREADSHEET = 10_000_000  # Google Sheets limit, counted over every worksheet's grid.
+
+    # CloudWatch Metrics Insights (fleet-wide GROUP BY queries instead of per-resource metrics)
+    USE_METRICS_INSIGHTS = False
+    METRICS_INSIGHTS_LIMIT = 500
+    METRICS_INSIGHTS_MAX_LOOKBACK_DAYS = 14  # Metrics Insights only queries the most recent two weeks.
+
+    # Local CloudWatch time-series store (each run only fetches the missing tail of a series)
+    METRIC_STORE = True
+    METRIC_STORE_PATH = CACHE_DIR / "metrics.sqlite"
+    METRIC_STORE_SETTLE_MINUTES = 60  # Newer periods may still receive datapoints and are re-fetched.
+    METRIC_STORE_RETENTION_DAYS = 40  # Longer than any lookback.
+
+    # Verdict cache (per-resource results reused until their inputs change or they expire)
+    VERDICT_CACHE = False  # Enabled per pipeline.
+    VERDICT_CACHE_PATH = CACHE_DIR / "verdicts.sqlite"
+    VERDICT_TTL_HOURS = 72
+    VERDICT_THRESHOLD_MARGIN = 0.2  # Metrics within 20% of a threshold are always re-evaluated.
+
+    # Price index (built from the bulk Price List offer files with build_price_index.py)
+    HOURS_PER_MONTH = 730
+    PRICE_INDEX_PATH = CACHE_DIR / "price_index.sqlite"
 
 # -------------------------------------------
 # EBS Unused
 # -------------------------------------------
 class EBSUnusedConfig(CommonConfig):
     LOOKBACK_DAYS = 32
+    VERDICT_CACHE = True
     SORT_ASCENDING = False
     SORT_BY_COLUMN = "Size (GB)"
     WORKSHEET_NAME = "EBS - Unused"
     OUTPUT_CSV = CommonConfig.OUTPUT_CSV_DIR / "ebs_unused.csv"
-    CSV_HEADERS = ["Volume ID", "Size (GB)", "Volume Type", "Created Time"]
+    CSV_HEADERS = ["Volume ID", "Size (GB)", "Volume Type", "Created Time", "Monthly Cost ($)"]
 
 # -------------------------------------------
 # EC2 Unused
 # -------------------------------------------
 class EC2UnusedConfig(CommonConfig):
     LOOKBACK_DAYS = 14
+    VERDICT_CACHE = True
     CPU_IDLE_THRESHOLD_PERCENTAGE = 5.0
     NET_IDLE_THRESHOLD_MB = 5 * 1024 * 1024
     WORKSHEET_NAME = "EC2 - Unused"
@@ -52,28 +133,33 @@ class EIPUnusedConfig(CommonConfig):
     SORT_BY_COLUMN = "Public IP"
     WORKSHEET_NAME = "EIP - Unused"
     OUTPUT_CSV = CommonConfig.OUTPUT_CSV_DIR / "eip_unused.csv"
-    CSV_HEADERS = ["Public IP", "Allocation ID"]
+    CSV_HEADERS = ["Public IP", "Allocation ID", "Monthly Cost ($)"]
+
+# -------------------------------------------
+# Logs Scan (shared by the Logs pipelines)
+# -------------------------------------------
+class LogsScanConfig(CommonConfig):
+    LOOKBACK_DAYS = 30  # IncomingBytes window of the shared log group scan.
 
 # -------------------------------------------
 # Logs Never Expire
 # -------------------------------------------
-class LogsNeverExpireConfig(CommonConfig):
+class LogsNeverExpireConfig(LogsScanConfig):
     SORT_ASCENDING = False
     SORT_BY_COLUMN = "Stored (GB)"
     WORKSHEET_NAME = "Logs - Never Expire"
     OUTPUT_CSV = CommonConfig.OUTPUT_CSV_DIR / "logs_never_expire.csv"
-    CSV_HEADERS = ["Log Group", "Stored (GB)", "Monthly Ingested (GB)"]
+    CSV_HEADERS = ["Log Group", "Stored (GB)", "Monthly Ingested (GB)", "Monthly Storage Cost ($)"]
 
 # -------------------------------------------
 # Logs High Ingestion
 # -------------------------------------------
-class LogsHighIngestionConfig(CommonConfig):
-    LOOKBACK_DAYS = 30
+class LogsHighIngestionConfig(LogsScanConfig):
     SORT_ASCENDING = False
     INGESTION_THRESHOLD_GB = 1000
     WORKSHEET_NAME = "Logs - High Ingestion"
     SORT_BY_COLUMN = "Monthly Ingested (GB)"
-    CSV_HEADERS = ["Log Group", "Monthly Ingested (GB)"]
+    CSV_HEADERS = ["Log Group", "Monthly Ingested (GB)", "Monthly Ingestion Cost ($)"]
     OUTPUT_CSV = CommonConfig.OUTPUT_CSV_DIR / "logs_high_ingestion.csv"
 
 # -------------------------------------------
@@ -84,6 +170,11 @@ class LambdaExcessMemoryConfig(CommonConfig):
     INVOCATION_LOOKBACK_DAYS = 30
     SORT_BY_COLUMN = "Invocations"
     LOGS_INSIGHTS_LOOKBACK_DAYS = 7
+    LOGS_INSIGHTS_MAX_LOG_GROUPS = 50
+    LOGS_INSIGHTS_TIME_SLICES = 4
+    LOGS_INSIGHTS_DAILY_CACHE = True  # Query only missing or still-open days, one slice per day.
+    LOGS_INSIGHTS_CACHE_SETTLE_HOURS = 3
+    LOGS_INSIGHTS_CACHE_PATH = CommonConfig.CACHE_DIR / "logs_insights_daily.sqlite"
     WORKSHEET_NAME = "Lambda - Excess Memory"
     OUTPUT_CSV = CommonConfig.OUTPUT_CSV_DIR / "lambda_excess_memory.csv"
     CSV_HEADERS = ["Lambda Name", "Assigned Memory (MB)", "Invocations", "Avg Bill Duration (seconds)", "Avg Memory Used", "Max Memory Used"]
@@ -99,7 +190,7 @@ class SnapshotOldConfig(CommonConfig):
     OUTPUT_CSV = CommonConfig.OUTPUT_CSV_DIR / "snapshot_old.csv"
     CSV_HEADERS = [
         "Snapshot ID", "Volume ID", "Volume Name", "Volume Type", "Attached Instance ID",
-        "Attached Instance Name", "Size (GB)", "Snapshot Date"
+        "Attached Instance Name", "Size (GB)", "Snapshot Date", "Monthly Cost ($)"
     ]
 
 # -------------------------------------------
@@ -107,10 +198,14 @@ class SnapshotOldConfig(CommonConfig):
 # -------------------------------------------
 class NATUnusedConfig(CommonConfig):
     LOOKBACK_DAYS = 30
+    FETCH_FILTERS = {
+        # Deleted and failed gateways are no longer billed.
+        "describe_nat_gateways": [{"Name": "state", "Values": ["pending", "available", "deleting"]}],
+    }
     WORKSHEET_NAME = "NAT - Unused"
     SORT_BY_COLUMN = "Created Time"
     OUTPUT_CSV = CommonConfig.OUTPUT_CSV_DIR / "nat_unused.csv"
-    CSV_HEADERS = ["NAT Gateway ID", "Vpc ID", "State", "Subnet ID", "Created Time"]
+    CSV_HEADERS = ["NAT Gateway ID", "Vpc ID", "State", "Subnet ID", "Created Time", "Monthly Cost ($)"]
 
 # -------------------------------------------
 # DynamoDB Unused
@@ -124,7 +219,7 @@ class DynamoDBUnusedConfig(CommonConfig):
     CSV_HEADERS = [
         "Table Name", "Capacity Mode", "Table Items", "Table Size (GB)", "Index Items", "Index Size (GB)",
         "Provisioned Read Units", "Provisioned Write Units", "Consumed Read Units", "Consumed Write Units",
-        "Created At", "Table Status", "GSI Count", "PITR Enabled"
+        "Created At", "Table Status", "GSI Count", "PITR Enabled", "Monthly Cost ($)"
     ]
 
 # -------------------------------------------
@@ -139,5 +234,5 @@ class KinesisExcessShardsConfig(CommonConfig):
     CSV_HEADERS = [
         "Stream Name", "Capacity", "Traffic Pattern", "Shard Count", "Retention (Hour)",
         "Avg Read (MB/s)", "Avg Write (MB/s)", "Max Read (MB/s)", "Max Write (MB/s)",
-        "Total Monthly Read (GB)", "Total Monthly Write (GB)", "Max Iterator Age (seconds)"
+        "Total Monthly Read (GB)", "Total Monthly Write (GB)", "Max Iterator Age (seconds)", "Monthly Shard Cost ($)"
     ]
@@ -0,0 +1,9 @@
+from pipelines.dynamo_unused import DynamoDBUnusedPipeline
+
+
+def test_run_units_without_units_writes_an_empty_report(monkeypatch, tmp_path):
+    monkeypatch.setattr(DynamoDBUnusedPipeline.CONFIG, "OUTPUT_CSV", tmp_path / "dynamodb_unused.csv")
+
+    DynamoDBUnusedPipeline.run_units([], ["us-east-1"])
+
+    assert (tmp_path / "dynamodb_unused.csv").read_text().splitlines()[0].startswith("Table Name")
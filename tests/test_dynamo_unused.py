@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import utils
+from pipelines.dynamo_unused import DynamoDBUnusedPipeline
+
+NOW = datetime.now(timezone.utc)
+
+
+class FakeDynamoDB:
+    def __init__(self, tables: dict[str, dict]):
+        self.tables = tables
+
+    def describe_table(self, TableName: str) -> dict:
+        return {"Table": self.tables[TableName]}
+
+    def describe_continuous_backups(self, TableName: str) -> dict:
+        return {"ContinuousBackupsDescription": {"PointInTimeRecoveryDescription": {"PointInTimeRecoveryStatus": "ENABLED"}}}
+
+
+class FakeCloudWatch:
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy, NextToken=None):
+        results = []
+        for query in MetricDataQueries:
+            metric_name = query["MetricStat"]["Metric"]["MetricName"]
+            value = 5.0 if metric_name.startswith("Provisioned") else 2.0
+            results.append({"Id": query["Id"], "Timestamps": [NOW - timedelta(days=1)], "Values": [value]})
+        return {"MetricDataResults": results}
+
+
+@pytest.fixture
+def tables() -> dict[str, dict]:
+    return {
+        "orders": {
+            "TableStatus": "ACTIVE",
+            "CreationDateTime": NOW - timedelta(days=100),
+            "BillingModeSummary": {"BillingMode": "PROVISIONED"},
+            "GlobalSecondaryIndexes": [{"IndexName": "by-customer"}],
+        },
+        "sessions": {
+            "TableStatus": "ACTIVE",
+            "CreationDateTime": NOW - timedelta(days=100),
+            "BillingModeSummary": {"BillingMode": "PAY_PER_REQUEST"},
+        },
+    }
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tables) -> DynamoDBUnusedPipeline:
+    clients = {"dynamodb": FakeDynamoDB(tables), "cloudwatch": FakeCloudWatch()}
+    monkeypatch.setattr(utils, "get_client", lambda service_name, *args: clients[service_name])
+    monkeypatch.setattr(DynamoDBUnusedPipeline.CONFIG, "METRIC_STORE", False)
+    monkeypatch.setattr(DynamoDBUnusedPipeline.CONFIG, "VERDICT_CACHE", False)
+    monkeypatch.setattr(DynamoDBUnusedPipeline.CONFIG, "USE_METRICS_INSIGHTS", False)
+    return DynamoDBUnusedPipeline("111111111111", "us-east-1")
+
+
+def test_prefetch_describes_tables_and_analyzes_capacity(pipeline, tables):
+    pipeline.prefetch(list(tables))
+
+    assert pipeline.table_descs == tables
+    # Table plus one GSI: consumed sums add up, provisioned averages add up per index.
+    assert pipeline.capacity["orders"] == {"read": 4.0, "write": 4.0, "rcu": 10.0, "wcu": 10.0}
+    assert pipeline.capacity["sessions"] == {"read": 2.0, "write": 2.0, "rcu": 0.0, "wcu": 0.0}
+
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import utils
+from pipelines.ec2_unused import EC2UnusedPipeline
+from settings import CommonConfig
+
+NOW = datetime.now(timezone.utc)
+
+
+class FakeCloudWatch:
+    """
+    Answers Metrics Insights queries from `groups` ({metric name: {instance id: max}},
+    lowest first) and per-instance queries from `maxima`.
+    """
+
+    def __init__(self, groups: dict[str, dict[str, float]], maxima: dict[str, float]):
+        self.groups = groups
+        self.maxima = maxima
+        self.expressions = []
+        self.instance_queries = []
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy, NextToken=None):
+        results = []
+        for query in MetricDataQueries:
+            if "Expression" in query:
+                self.expressions.append(query["Expression"])
+                metric_name = query["Expression"].split("(")[1].split(")")[0]
+                results.extend(
+                    {"Id": query["Id"], "Label": instance_id, "Timestamps": [NOW - timedelta(days=1)], "Values": [value]}
+                    for instance_id, value in self.groups[metric_name].items()
+                )
+            else:
+                instance_id = query["MetricStat"]["Metric"]["Dimensions"][0]["Value"]
+                self.instance_queries.append(instance_id)
+                results.append({
+                    "Id": query["Id"], "Timestamps": [NOW - timedelta(days=1)], "Values": [self.maxima[instance_id]],
+                })
+        return {"MetricDataResults": results}
+
+
+def instance(instance_id: str) -> dict:
+    return {
+        "InstanceId": instance_id,
+        "InstanceType": "m5.large",
+        "State": {"Name": "running"},
+        "LaunchTime": NOW - timedelta(days=60),
+    }
+
+
+def make_pipeline(monkeypatch, cw: FakeCloudWatch) -> EC2UnusedPipeline:
+    monkeypatch.setattr(utils, "get_client", lambda service_name, *args: cw if service_name == "cloudwatch" else None)
+    monkeypatch.setattr(EC2UnusedPipeline.CONFIG, "METRIC_STORE", False)
+    monkeypatch.setattr(EC2UnusedPipeline.CONFIG, "VERDICT_CACHE", False)
+    monkeypatch.setattr(EC2UnusedPipeline.CONFIG, "USE_METRICS_INSIGHTS", True)
+    monkeypatch.setattr(CommonConfig, "METRICS_INSIGHTS_LIMIT", 2)
+    return EC2UnusedPipeline("111111111111", "us-east-1")
+
+
+@pytest.mark.parametrize("metric_name", ["CPUUtilization", "NetworkIn", "NetworkOut"])
+def test_metrics_insights_queries_lowest_maxima_first(monkeypatch, metric_name):
+    groups = {name: {} for name in EC2UnusedPipeline.METRICS.values()}
+    cw = FakeCloudWatch(groups, {})
+    pipeline = make_pipeline(monkeypatch, cw)
+    pipeline.prefetch([instance("i-a")])
+
+    assert (
+        f'SELECT MAX({metric_name}) FROM SCHEMA("AWS/EC2", InstanceId) GROUP BY InstanceId ORDER BY MAX() ASC LIMIT 2'
+        in cw.expressions
+    )
+
+
+def test_instances_past_a_truncated_busy_group_are_busy_without_fetching(monkeypatch):
+    groups = {name: {"i-a": 0.0, "i-b": 0.0} for name in EC2UnusedPipeline.METRICS.values()}
+    groups["CPUUtilization"] = {"i-a": 1.0, "i-b": 50.0}
+    cw = FakeCloudWatch(groups, {})
+    pipeline = make_pipeline(monkeypatch, cw)
+
+    pipeline.prefetch([instance("i-a"), instance("i-b"), instance("i-c")])
+
+    assert cw.instance_queries == []
+    assert pipeline.busy == {"i-a": False, "i-b": True, "i-c": True}
+
+
+def test_truncated_idle_groups_fall_back_to_per_instance_queries(monkeypatch):
+    groups = {name: {"i-a": 0.0, "i-b": 0.0} for name in EC2UnusedPipeline.METRICS.values()}
+    groups["CPUUtilization"] = {"i-a": 1.0, "i-b": 2.0}
+    cw = FakeCloudWatch(groups, {"i-c": 3.0})
+    pipeline = make_pipeline(monkeypatch, cw)
+
+    pipeline.prefetch([instance("i-a"), instance("i-b"), instance("i-c")])
+
+    assert sorted(set(cw.instance_queries)) == ["i-c"]
+    assert pipeline.busy == {"i-a": False, "i-b": False, "i-c": False}
@@ -0,0 +1,21 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def loaded_modules(statement: str) -> set[str]:
+    code = f"import sys; {statement}; print(' '.join(sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return set(output.split())
+
+
+def test_main_and_plain_pipelines_do_not_import_heavy_modules():
+    modules = loaded_modules("import main, pipelines.logs_never_expire")
+
+    assert not {"numpy", "gspread", "google.oauth2"} & modules
+
+
+def test_vectorized_pipelines_import_numpy():
+    assert "numpy" in loaded_modules("import pipelines.ec2_unused")
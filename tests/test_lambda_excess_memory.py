@@ -0,0 +1,77 @@
+import logging
+from concurrent.futures import Future
+
+import pytest
+
+import utils
+from pipelines.lambda_excess_memory import LambdaExcessMemoryPipeline
+
+LOG_GROUP = "/aws/lambda/f"
+
+
+class FakeQueryManager:
+    """
+    Every query reports one invocation of 100 ms; queries starting at `failing_start`
+    fail.
+    """
+
+    def __init__(self):
+        self.failing_start = None
+        self.windows = []
+
+    def submit(self, query_string, log_group_names, start_time, end_time) -> Future:
+        self.windows.append(start_time)
+        future = Future()
+        if start_time == self.failing_start:
+            future.set_exception(RuntimeError("query failed"))
+        else:
+            future.set_result([[
+                {"field": "@log", "value": f"111111111111:{name}"},
+                {"field": "sum_billed", "value": "100"},
+                {"field": "count_billed", "value": "1"},
+            ] for name in log_group_names])
+        return future
+
+
+@pytest.fixture
+def query_manager(monkeypatch, tmp_path) -> FakeQueryManager:
+    manager = FakeQueryManager()
+    monkeypatch.setattr(utils, "get_client", lambda service_name, *args: None)
+    monkeypatch.setattr(utils, "get_logs_query_manager", lambda *args: manager)
+    monkeypatch.setattr(LambdaExcessMemoryPipeline.CONFIG, "LOGS_INSIGHTS_DAILY_CACHE", True)
+    monkeypatch.setattr(LambdaExcessMemoryPipeline.CONFIG, "LOGS_INSIGHTS_LOOKBACK_DAYS", 3)
+    monkeypatch.setattr(LambdaExcessMemoryPipeline.CONFIG, "LOGS_INSIGHTS_CACHE_PATH", tmp_path / "daily.sqlite")
+    return manager
+
+
+def test_closed_days_come_from_the_daily_cache(query_manager):
+    first = LambdaExcessMemoryPipeline("111111111111", "us-east-1")
+    days = first._get_days()
+    assert first._query_log_groups([LOG_GROUP])[LOG_GROUP]["count_billed"] == len(days)
+
+    query_manager.windows.clear()
+    second = LambdaExcessMemoryPipeline("111111111111", "us-east-1")
+    second.end_time = first.end_time
+
+    assert second._query_log_groups([LOG_GROUP])[LOG_GROUP]["count_billed"] == len(days)
+    assert query_manager.windows == [day_start for _, day_start, _, closed in days if not closed]
+
+
+def test_failed_closed_day_is_logged_and_not_cached(query_manager, caplog):
+    pipeline = LambdaExcessMemoryPipeline("111111111111", "us-east-1")
+    day, day_start, _, closed = pipeline._get_days()[0]
+    assert closed
+    query_manager.failing_start = day_start
+
+    with caplog.at_level(logging.WARNING, logger=utils.logger.name):
+        merged = pipeline._query_log_groups([LOG_GROUP])
+
+    assert merged[LOG_GROUP]["count_billed"] == len(pipeline._get_days()) - 1
+    assert f"miss {day_start:%Y-%m-%d %H:%M:%S}" in caplog.text
+    assert (LOG_GROUP, day) not in pipeline.daily_cache.get(pipeline.cache_namespace, [day])
+
+    # The next run queries the missing day again.
+    query_manager.failing_start = None
+    query_manager.windows.clear()
+    pipeline._query_log_groups([LOG_GROUP])
+    assert day_start in query_manager.windows
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import utils
+from settings import CommonConfig
+
+
+class FakeLogsClient:
+    class exceptions:
+        class LimitExceededException(Exception):
+            pass
+
+    def __init__(self, poll_error: Exception = None):
+        self.poll_error = poll_error
+        self.stopped = []
+
+    def start_query(self, **kwargs):
+        return {"queryId": "q-1"}
+
+    def get_query_results(self, queryId):
+        if self.poll_error:
+            raise self.poll_error
+        return {"status": "Complete", "results": [[{"field": "n", "value": "1"}]]}
+
+    def stop_query(self, queryId):
+        self.stopped.append(queryId)
+
+
+def submit(manager: utils.LogsInsightsQueryManager):
+    start_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return manager.submit("stats count(*) as n", ["/aws/lambda/f"], start_time, start_time)
+
+
+def test_query_manager_reads_defaults_at_construction(monkeypatch):
+    monkeypatch.setattr(CommonConfig, "LOGS_INSIGHTS_MAX_CONCURRENT_QUERIES", 3)
+    monkeypatch.setattr(CommonConfig, "LOGS_INSIGHTS_QUERY_TIMEOUT_SECONDS", 60)
+
+    manager = utils.LogsInsightsQueryManager(FakeLogsClient())
+
+    assert (manager.max_concurrent, manager.timeout_seconds) == (3, 60)
+
+
+def test_query_manager_returns_results():
+    manager = utils.LogsInsightsQueryManager(FakeLogsClient())
+
+    assert submit(manager).result(timeout=5) == [[{"field": "n", "value": "1"}]]
+
+
+def test_query_manager_stops_query_when_polling_fails():
+    logs = FakeLogsClient(poll_error=RuntimeError("boom"))
+    manager = utils.LogsInsightsQueryManager(logs)
+
+    with pytest.raises(RuntimeError, match="boom"):
+        submit(manager).result(timeout=5)
+    assert logs.stopped == ["q-1"]
+
+
+def test_split_time_range_covers_the_range_without_overlap():
+    start_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    end_time = datetime(2024, 1, 1, 0, 0, 10, tzinfo=timezone.utc)
+
+    slices = utils.split_time_range(start_time, end_time, 3)
+
+    seconds = [(int(start.timestamp()) - 1704067200, int(end.timestamp()) - 1704067200) for start, end in slices]
+    assert seconds == [(0, 2), (3, 5), (6, 10)]
+
+
+def test_split_time_range_drops_empty_slices():
+    start_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    assert utils.split_time_range(start_time, start_time + timedelta(seconds=1), 4) == [
+        (start_time, start_time + timedelta(seconds=1)),
+    ]
+
+
+def test_merge_partial_aggregates():
+    merged = utils.merge_partial_aggregates([
+        {"sum_billed": 300.0, "count_billed": 3.0, "max_memory": 128.0, "min_memory": 60.0},
+        {"sum_billed": 100.0, "count_billed": 1.0, "max_memory": 256.0, "min_memory": 90.0},
+        {},
+    ])
+
+    assert merged == {
+        "sum_billed": 400.0, "count_billed": 4.0, "avg_billed": 100.0, "max_memory": 256.0, "min_memory": 60.0,
+    }
+    assert utils.merge_partial_aggregates([{"sum_billed": 0.0, "count_billed": 0.0}])["avg_billed"] == 0.0
+
+
+def test_daily_partials_cache_round_trip(tmp_path):
+    cache = utils.DailyPartialsCache(tmp_path / "daily.sqlite")
+    cache.put("ns", {("/aws/lambda/f", "2024-01-01"): {"max_memory": 128.0}, ("/aws/lambda/f", "2024-01-02"): {}})
+
+    assert cache.get("ns", ["2024-01-01", "2024-01-02", "2024-01-03"]) == {
+        ("/aws/lambda/f", "2024-01-01"): {"max_memory": 128.0},
+        ("/aws/lambda/f", "2024-01-02"): {},
+    }
+    assert cache.get("other", ["2024-01-01"]) == {}
+
+    cache.prune("ns", "2024-01-02")
+    assert list(cache.get("ns", ["2024-01-01", "2024-01-02"])) == [("/aws/lambda/f", "2024-01-02")]
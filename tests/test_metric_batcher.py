@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+
+import utils
+
+END_TIME = datetime(2024, 1, 15, tzinfo=timezone.utc)
+START_TIME = END_TIME - timedelta(days=14)
+
+
+class PagingCloudWatch:
+    """
+    Returns two datapoints per query, split across two pages. A query's values encode
+    its volume number, so a mismatched Id shows up in the results.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy, NextToken=None):
+        self.calls.append((len(MetricDataQueries), NextToken))
+        page = 1 if NextToken else 0
+
+        results = []
+        for query in MetricDataQueries:
+            number = int(query["MetricStat"]["Metric"]["Dimensions"][0]["Value"].split("-")[1])
+            results.append({
+                "Id": query["Id"],
+                "Timestamps": [START_TIME + timedelta(days=page)],
+                "Values": [number + page / 10],
+            })
+
+        response = {"MetricDataResults": results}
+        if not NextToken:
+            response["NextToken"] = "page-2"
+        return response
+
+
+def add_volume(batcher: utils.MetricDataBatcher, number: int):
+    dimensions = [{"Name": "VolumeId", "Value": f"vol-{number}"}]
+    batcher.add(f"vol-{number}", "reads", "AWS/EBS", "VolumeReadOps", dimensions, 86400, "Sum")
+    batcher.add(f"vol-{number}", "writes", "AWS/EBS", "VolumeWriteOps", dimensions, 86400, "Sum")
+
+
+def test_queries_are_packed_500_per_call_and_paginated():
+    cw = PagingCloudWatch()
+    batcher = utils.MetricDataBatcher(cw, START_TIME, END_TIME)
+    for number in range(501):
+        add_volume(batcher, number)
+
+    batcher.execute()
+
+    assert cw.calls == [(500, None), (500, "page-2"), (500, None), (500, "page-2"), (2, None), (2, "page-2")]
+
+
+def test_results_map_back_to_keys_and_labels_with_pages_merged():
+    cw = PagingCloudWatch()
+    batcher = utils.MetricDataBatcher(cw, START_TIME, END_TIME)
+    for number in range(300):
+        add_volume(batcher, number)
+
+    results = batcher.execute()
+
+    assert len(results) == 300
+    assert set(results["vol-299"]) == {"reads", "writes"}
+    assert results["vol-299"]["writes"] == utils.MetricSeries(
+        [START_TIME, START_TIME + timedelta(days=1)], [299.0, 299.1],
+    )
+    assert all(series.values[0] == number for number in range(300) for series in results[f"vol-{number}"].values())
+
+
+def test_execute_clears_the_pending_queries():
+    cw = PagingCloudWatch()
+    batcher = utils.MetricDataBatcher(cw, START_TIME, END_TIME)
+    add_volume(batcher, 1)
+    batcher.execute()
+
+    assert batcher.execute() == {}
+    assert len(cw.calls) == 2
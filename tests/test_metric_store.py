@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+
+import utils
+
+DAY = 86400
+
+
+class FakeCloudWatch:
+    """Daily buckets from StartTime, each worth 1.0."""
+
+    def __init__(self):
+        self.requested_points = 0
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy, NextToken=None):
+        timestamps = []
+        ts = StartTime
+        while ts < EndTime:
+            timestamps.append(ts)
+            ts += timedelta(seconds=DAY)
+
+        self.requested_points += len(timestamps) * len(MetricDataQueries)
+        results = [{"Id": query["Id"], "Timestamps": timestamps, "Values": [1.0] * len(timestamps)} for query in MetricDataQueries]
+        return {"MetricDataResults": results}
+
+
+def fetch(cw, store, start_time, end_time) -> utils.MetricSeries:
+    batcher = utils.MetricDataBatcher(cw, start_time, end_time, store=store, scope="111:us-east-1")
+    batcher.add("vol-1", "reads", "AWS/EBS", "VolumeReadOps", [{"Name": "VolumeId", "Value": "vol-1"}], DAY, "Sum")
+    return batcher.execute()["vol-1"]["reads"]
+
+
+def test_store_backed_series_start_at_the_window_start(tmp_path):
+    end_time = datetime.now(timezone.utc).replace(hour=10, minute=37, second=0, microsecond=0)
+    start_time = end_time - timedelta(days=14)
+    store = utils.MetricStore(tmp_path / "metrics.sqlite")
+
+    plain = fetch(FakeCloudWatch(), None, start_time, end_time)
+    stored = fetch(FakeCloudWatch(), store, start_time, end_time)
+
+    assert min(stored.timestamps) >= start_time
+    assert sum(stored.values) == sum(plain.values) == 14
+
+    # A later run reads the settled days from the store and only fetches the tail.
+    cw = FakeCloudWatch()
+    again = fetch(cw, store, start_time, end_time)
+    assert again == stored
+    assert cw.requested_points < 14
+
+
+def test_prune_drops_points_past_retention(tmp_path):
+    store = utils.MetricStore(tmp_path / "metrics.sqlite")
+    old = int((datetime.now(timezone.utc) - timedelta(days=365)).timestamp())
+    store.put({"series": [(old, 1.0)]}, {"series": (old, old + DAY)})
+
+    store.prune()
+
+    assert store.get_points(["series"]) == {}
@@ -0,0 +1,62 @@
+import csv
+import json
+
+import pytest
+
+import utils
+
+HEADER = [
+    "SKU", "TermType", "Currency", "PricePerUnit", "Unit", "StartingRange", "PriceDescription", "Product Family",
+    "serviceCode", "Region Code", "Location", "usageType", "Instance Type", "Operating System", "Tenancy",
+    "CapacityStatus", "Pre Installed S/W", "License Model", "Volume API Name",
+]
+
+
+def instance_row(sku: str, price: str, description: str, capacity_status: str, software: str,
+                 operating_system: str = "Linux", license_model: str = "No License required") -> list[str]:
+    return [
+        sku, "OnDemand", "USD", price, "Hrs", "0", description, "Compute Instance", "AmazonEC2", "us-east-1",
+        "US East (N. Virginia)", "BoxUsage:m5.large", "m5.large", operating_system, "Shared", capacity_status,
+        software, license_model, "",
+    ]
+
+
+@pytest.fixture
+def price_index(tmp_path) -> utils.PriceIndex:
+    offer = tmp_path / "ec2.csv"
+    with open(offer, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["FormatVersion", "v1.0"])
+        writer.writerow(HEADER)
+        writer.writerow(instance_row("A", "0.50", "$0.50 per Reserved m5.large", "AllocatedCapacityReservation", "NA"))
+        writer.writerow(instance_row("B", "0.30", "$0.30 per Linux with SQL Std m5.large", "Used", "SQL Std"))
+        writer.writerow(instance_row("C", "0.20", "$0.20 per Unused Reservation m5.large", "UnusedCapacityReservation", "NA"))
+        writer.writerow(instance_row("D", "0.096", "$0.096 per On Demand Linux m5.large", "Used", "NA"))
+        writer.writerow(instance_row(
+            "E", "0.096", "$0.096 per On Demand Windows BYOL m5.large", "Used", "NA", "Windows", "Bring your own license",
+        ))
+        writer.writerow(instance_row(
+            "F", "0.188", "$0.188 per On Demand Windows m5.large", "Used", "NA", "Windows", "License included",
+        ))
+
+    path = tmp_path / "prices.sqlite"
+    utils.PriceIndex.build([offer], path)
+    return utils.PriceIndex(path)
+
+
+def test_ec2_hourly_price_matches_used_capacity_and_software(price_index):
+    assert price_index.is_current()
+    assert price_index.ec2_hourly_price("m5.large", "us-east-1", "Linux", has_license=False) == 0.096
+    assert price_index.ec2_hourly_price("m5.large", "us-east-1", "Linux", has_license=True) == 0.30
+
+
+def test_windows_instances_get_the_license_included_price(price_index):
+    assert price_index.ec2_hourly_price("m5.large", "us-east-1", "Windows", has_license=False) == 0.188
+
+
+def test_json_ec2_offer_is_rejected(tmp_path):
+    offer = tmp_path / "ec2.json"
+    offer.write_text(json.dumps({"formatVersion": "v1.0", "offerCode": "AmazonEC2", "products": {}, "terms": {}}))
+
+    with pytest.raises(ValueError, match="CSV"):
+        utils.PriceIndex.build([offer], tmp_path / "prices.sqlite")
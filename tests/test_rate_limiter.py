@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+import utils
+from settings import CommonConfig
+
+EC2 = "ec2:home:us-east-1"
+KINESIS = "kinesis:home:us-east-1"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(monkeypatch, clock) -> utils.AdaptiveRateLimiter:
+    monkeypatch.setattr(CommonConfig, "RATE_LIMIT_INITIAL_RPS", {"ec2": 20, "kinesis": 10})
+    monkeypatch.setattr(CommonConfig, "RATE_LIMIT_MIN_RPS", 1)
+    monkeypatch.setattr(CommonConfig, "RATE_LIMIT_MAX_RPS", 200)
+    monkeypatch.setattr(CommonConfig, "RATE_LIMIT_INCREASE_RPS", 1.0)
+    monkeypatch.setattr(CommonConfig, "RATE_LIMIT_DECREASE_FACTOR", 0.5)
+    return utils.AdaptiveRateLimiter()
+
+
+def test_successes_increase_the_rate_additively(limiter):
+    limiter.record(EC2, throttled=False)
+
+    assert limiter.rates()[EC2] == pytest.approx(20 + 1 / 20)
+
+
+def test_throttling_halves_the_rate_at_most_once_per_second(limiter, clock):
+    limiter.record(EC2, throttled=True)
+    limiter.record(EC2, throttled=True)
+    assert limiter.rates()[EC2] == 10
+
+    clock.advance(1.0)
+    limiter.record(EC2, throttled=True)
+    assert limiter.rates()[EC2] == 5
+
+
+def test_rate_stays_between_floor_and_ceiling(limiter, clock, monkeypatch):
+    for _ in range(10):
+        clock.advance(1.0)
+        limiter.record(EC2, throttled=True)
+    assert limiter.rates()[EC2] == CommonConfig.RATE_LIMIT_MIN_RPS
+
+    monkeypatch.setattr(CommonConfig, "RATE_LIMIT_MAX_RPS", 2)
+    for _ in range(10):
+        limiter.record(EC2, throttled=False)
+    assert limiter.rates()[EC2] == 2
+
+
+def test_buckets_are_kept_per_service_key(limiter):
+    limiter.record(EC2, throttled=True)
+    limiter.record(KINESIS, throttled=False)
+
+    assert limiter.rates() == {EC2: 10, KINESIS: pytest.approx(10 + 1 / 10)}
+
+
+def test_reserve_delays_callers_past_one_second_of_tokens(limiter, clock):
+    assert [limiter.reserve(KINESIS) for _ in range(10)] == [0.0] * 10
+    assert limiter.reserve(KINESIS) == pytest.approx(0.1)
+
+    clock.advance(0.2)
+    assert limiter.reserve(KINESIS) == 0.0
+
+
+@pytest.mark.parametrize("enabled, mode", [(True, "standard"), (False, "adaptive")])
+def test_client_config_leaves_rate_limiting_to_the_shared_limiter(monkeypatch, enabled, mode):
+    monkeypatch.setattr(CommonConfig, "RATE_LIMIT_ENABLED", enabled)
+    monkeypatch.setattr(CommonConfig, "AWS_RETRY_MODE", "adaptive")
+
+    assert utils.client_config().retries["mode"] == mode
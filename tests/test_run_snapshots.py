@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import utils
+from pipelines.eip_unused import EIPUnusedPipeline
+from pipelines.logs_high_ingestion import LogsHighIngestionPipeline
+from pipelines.logs_never_expire import LogsNeverExpirePipeline
+from pipelines.snapshot_old import SnapshotOldPipeline
+from settings import CommonConfig
+
+ACCOUNT_ID = "111111111111"
+REGION = "us-east-1"
+OLD = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+class FakePaginator:
+    def __init__(self, client, operation: str, pages: list[dict]):
+        self.client = client
+        self.operation = operation
+        self.pages = pages
+
+    def paginate(self, **kwargs):
+        self.client.calls.append(self.operation)
+        return iter(self.pages)
+
+
+class FakeEC2:
+    def __init__(self):
+        self.calls = []
+
+    def get_paginator(self, operation: str) -> FakePaginator:
+        pages = {
+            "describe_instances": [{"Reservations": [{"Instances": [
+                {"InstanceId": "i-run", "State": {"Name": "running"}, "Tags": [{"Key": "Name", "Value": "web"}]},
+                {"InstanceId": "i-stop", "State": {"Name": "stopped"}},
+            ]}]}],
+            "describe_volumes": [{"Volumes": [
+                {"VolumeId": "vol-1", "VolumeType": "gp3", "Attachments": [{"InstanceId": "i-run"}],
+                 "Tags": [{"Key": "Name", "Value": "root"}]},
+            ]}],
+            "describe_snapshots": [{"Snapshots": [
+                {"SnapshotId": "snap-1", "VolumeId": "vol-1", "VolumeSize": 8, "StartTime": OLD},
+                {"SnapshotId": "snap-2", "VolumeId": "vol-gone", "VolumeSize": 4, "StartTime": OLD},
+            ]}],
+        }
+        return FakePaginator(self, operation, pages[operation])
+
+    def describe_addresses(self, Filters=None):
+        self.calls.append("describe_addresses")
+        return {"Addresses": [
+            {"PublicIp": "1.1.1.1", "AllocationId": "a-1", "InstanceId": "i-run"},
+            {"PublicIp": "2.2.2.2", "AllocationId": "a-2", "InstanceId": "i-stop"},
+            {"PublicIp": "3.3.3.3", "AllocationId": "a-3"},
+        ]}
+
+
+class FakeLogs:
+    def __init__(self):
+        self.calls = []
+
+    def get_paginator(self, operation: str) -> FakePaginator:
+        return FakePaginator(self, operation, [{"logGroups": [
+            {"logGroupName": "/app/forever", "storedBytes": 5_000_000_000},
+            {"logGroupName": "/app/noisy", "storedBytes": 1_000_000_000, "retentionInDays": 7},
+        ]}])
+
+
+class FakeCloudWatch:
+    def __init__(self):
+        self.calls = []
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy, NextToken=None):
+        self.calls.append(len(MetricDataQueries))
+        results = []
+        for query in MetricDataQueries:
+            log_group = query["MetricStat"]["Metric"]["Dimensions"][0]["Value"]
+            value = 2_000_000_000_000.0 if log_group == "/app/noisy" else 1_000_000_000.0
+            results.append({"Id": query["Id"], "Timestamps": [EndTime - timedelta(days=1)], "Values": [value]})
+        return {"MetricDataResults": results}
+
+
+@pytest.fixture
+def clients(monkeypatch, tmp_path) -> dict:
+    clients = {"ec2": FakeEC2(), "logs": FakeLogs(), "cloudwatch": FakeCloudWatch()}
+    monkeypatch.setattr(utils, "get_client", lambda service_name, *args: clients[service_name])
+    monkeypatch.setattr(utils, "monthly_usage_cost", lambda *args, **kwargs: 1.0)
+    monkeypatch.setattr(utils, "_run_snapshots", {})
+    monkeypatch.setattr(CommonConfig, "RUN_SNAPSHOT_DIR", tmp_path / "runs")
+    monkeypatch.setattr(CommonConfig, "METRIC_STORE", False)
+    monkeypatch.setenv(utils.RUN_ID_ENV, "run-1")
+    return clients
+
+
+def rows(pipeline) -> list[tuple]:
+    pipeline.collect()
+    return [row[:-2] for row in pipeline.results.iter_sorted_rows()]
+
+
+def test_run_snapshot_is_built_once_and_loaded_from_disk(clients, monkeypatch):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"built": len(builds)}
+
+    assert utils.load_run_snapshot("thing", build) == {"built": 1}
+    assert utils.load_run_snapshot("thing", build) == {"built": 1}
+
+    # Another process has no in-memory copy and loads the pickled snapshot instead.
+    monkeypatch.setattr(utils, "_run_snapshots", {})
+    assert utils.load_run_snapshot("thing", build) == {"built": 1}
+    assert builds == [1]
+    assert (CommonConfig.RUN_SNAPSHOT_DIR / "run-1" / "thing.pkl").exists()
+
+    utils.end_run()
+    assert not (CommonConfig.RUN_SNAPSHOT_DIR / "run-1").exists()
+
+
+def test_eip_and_snapshot_pipelines_share_one_inventory(clients):
+    eip_rows = rows(EIPUnusedPipeline(ACCOUNT_ID, REGION))
+    snapshot_rows = rows(SnapshotOldPipeline(ACCOUNT_ID, REGION))
+
+    assert sorted(clients["ec2"].calls) == [
+        "describe_addresses", "describe_instances", "describe_snapshots", "describe_volumes",
+    ]
+    assert sorted(eip_rows) == [("2.2.2.2", "a-2", 1.0), ("3.3.3.3", "a-3", 1.0)]
+    assert sorted(row[:6] for row in snapshot_rows) == [
+        ("snap-1", "vol-1", "root", "gp3", "i-run", "web"),
+        ("snap-2", "vol-gone", "DeletedVolume", "Unknown", "N/A", "N/A"),
+    ]
+
+
+def test_logs_pipelines_share_one_log_group_scan(clients):
+    never_expire_rows = rows(LogsNeverExpirePipeline(ACCOUNT_ID, REGION))
+    high_ingestion_rows = rows(LogsHighIngestionPipeline(ACCOUNT_ID, REGION))
+
+    assert clients["logs"].calls == ["describe_log_groups"]
+    assert clients["cloudwatch"].calls == [2]
+    assert never_expire_rows == [("/app/forever", 5.0, 1.0, 1.0)]
+    assert high_ingestion_rows == [("/app/noisy", 2000.0, 1.0)]
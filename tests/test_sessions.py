@@ -0,0 +1,33 @@
+import utils
+
+
+class FakeCredentials:
+    method = "fake"
+
+
+def test_member_account_sessions_resolve_the_assumed_role_credentials(monkeypatch):
+    credentials = FakeCredentials()
+    monkeypatch.setattr(utils, "_sessions", {})
+    monkeypatch.setattr(utils, "get_home_account_id", lambda: "111111111111")
+    monkeypatch.setattr(utils, "_get_assumed_role_credentials", lambda account_id: credentials)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "home-key")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "home-secret")
+
+    session = utils.get_boto3_session("us-east-1", "222222222222")
+
+    assert session.get_credentials() is credentials
+    assert session._session.get_component("data_loader") is utils.get_shared_loader()
+    assert utils.get_boto3_session("us-east-1", "222222222222") is session
+
+
+def test_home_account_sessions_use_the_shared_loader(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)  # No local credentials file.
+    monkeypatch.setattr(utils, "_sessions", {})
+    monkeypatch.setattr(utils, "get_home_account_id", lambda: "111111111111")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "home-key")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "home-secret")
+
+    session = utils.get_boto3_session("us-east-1", "111111111111")
+
+    assert session.get_credentials().access_key == "home-key"
+    assert session._session.get_component("data_loader") is utils.get_shared_loader()
@@ -0,0 +1,100 @@
+import csv
+
+import pytest
+
+import utils
+from settings import CommonConfig
+
+
+class FakeWorksheet:
+    def __init__(self, title: str, row_count: int, col_count: int):
+        self.title, self.row_count, self.col_count, self.id = title, row_count, col_count, title
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.sheets: dict[str, FakeWorksheet] = {}
+        self.writes: list[dict] = []
+
+    def worksheets(self) -> list[FakeWorksheet]:
+        return list(self.sheets.values())
+
+    def batch_update(self, body: dict) -> None:
+        for request in body["requests"]:
+            if "addSheet" in request:
+                properties = request["addSheet"]["properties"]
+                grid = properties["gridProperties"]
+                self.sheets[properties["title"]] = FakeWorksheet(properties["title"], grid["rowCount"], grid["columnCount"])
+
+    def values_batch_clear(self, body: dict) -> None:
+        pass
+
+    def values_batch_update(self, body: dict) -> None:
+        self.writes.extend(body["data"])
+
+
+@pytest.fixture
+def spreadsheet(monkeypatch) -> FakeSpreadsheet:
+    spreadsheet = FakeSpreadsheet()
+
+    class FakeClient:
+        def open(self, name: str) -> FakeSpreadsheet:
+            return spreadsheet
+
+    monkeypatch.setattr(utils, "get_gspread_client", lambda: FakeClient())
+    monkeypatch.setattr(CommonConfig, "SHEETS_WRITE_REQUESTS_PER_MINUTE", 10_000)
+    return spreadsheet
+
+
+def write_report(path, rows: list[list[str]]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows([["Id", "Cost"]] + rows)
+
+
+def test_publish_sends_only_changed_row_runs(tmp_path, spreadsheet, monkeypatch):
+    monkeypatch.setattr(CommonConfig, "SHEETS_CHUNK_ROWS", 2)
+    report = tmp_path / "report.csv"
+    publisher = utils.SheetPublisher(state_path=tmp_path / "state.json")
+
+    write_report(report, [[f"r{i}", str(i)] for i in range(5)])
+    publisher.publish({"Report": report})
+    assert sum(len(write["values"]) for write in spreadsheet.writes) == 6
+    assert all(len(write["values"]) <= 2 for write in spreadsheet.writes)
+
+    spreadsheet.writes.clear()
+    write_report(report, [[f"r{i}", str(i * 10 if i == 3 else i)] for i in range(4)])
+    publisher.publish({"Report": report})
+
+    # Row r3 changed, and the old row r4 is blanked.
+    assert spreadsheet.writes == [{"range": "'Report'!A5:B6", "values": [["r3", "30"], ["", ""]]}]
+
+
+def test_publish_rolls_over_into_overflow_worksheets(tmp_path, spreadsheet, monkeypatch):
+    monkeypatch.setattr(CommonConfig, "SHEETS_MAX_CELLS_PER_WORKSHEET", 8)  # Header plus 3 rows of 2 columns.
+    report = tmp_path / "report.csv"
+
+    write_report(report, [[f"r{i}", str(i)] for i in range(7)])
+    utils.SheetPublisher(state_path=tmp_path / "state.json").publish({"Report": report})
+
+    assert set(spreadsheet.sheets) == {"Report", "Report (2)", "Report (3)"}
+    written = {write["range"].split("!")[0]: write["values"] for write in spreadsheet.writes}
+    assert written["'Report (3)'"] == [["Id", "Cost"], ["r6", "6"]]
+
+
+def test_publish_counts_every_worksheet_against_the_spreadsheet_limit(tmp_path, spreadsheet, monkeypatch):
+    monkeypatch.setattr(CommonConfig, "SHEETS_MAX_CELLS_PER_WORKSHEET", 8)
+    monkeypatch.setattr(CommonConfig, "SHEETS_MAX_CELLS_PER_SPREADSHEET", 20)
+    spreadsheet.sheets["Notes"] = FakeWorksheet("Notes", 5, 2)
+    report = tmp_path / "report.csv"
+    publisher = utils.SheetPublisher(state_path=tmp_path / "state.json")
+
+    # The report needs 8 + 6 cells, which only fit once the 10 cell "Notes" worksheet is gone.
+    write_report(report, [[f"r{i}", str(i)] for i in range(5)])
+    with pytest.raises(ValueError, match="24 cells"):
+        publisher.publish({"Report": report})
+    assert set(spreadsheet.sheets) == {"Notes"}
+    assert spreadsheet.writes == []
+
+    del spreadsheet.sheets["Notes"]
+    publisher.publish({"Report": report})
+    assert set(spreadsheet.sheets) == {"Report", "Report (2)"}
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from pipelines.base import BasePipeline
+from settings import CommonConfig
+
+
+class StreamConfig(CommonConfig):
+    STREAM_CHUNK_SIZE = 3
+    STREAM_QUEUE_CHUNKS = 1
+    STREAM_MAX_IN_FLIGHT = 2
+    SORT_BY_COLUMN = "Item"
+    CSV_HEADERS = ["Item"]
+
+
+class StreamPipeline(BasePipeline):
+    CONFIG = StreamConfig
+
+    def __init__(self, items, fail_prefetch: bool = False):
+        super().__init__("111111111111", "us-east-1")
+        self.items = items
+        self.fail_prefetch = fail_prefetch
+        self.chunks = []
+
+    def fetch_items(self):
+        yield from self.items
+
+    def prefetch(self, items):
+        if self.fail_prefetch:
+            raise RuntimeError("prefetch failed")
+        self.chunks.append(list(items))
+
+    def process_item(self, item) -> bool:
+        if item % 2:
+            return False
+        self.add_result([item])
+        return True
+
+
+def failing_after(count: int):
+    yield from range(count)
+    raise ValueError("listing failed")
+
+
+def producer_stopped(timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not any(thread.name == "StreamPipeline-producer" for thread in threading.enumerate()):
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_generator_items_are_streamed_in_chunks():
+    pipeline = StreamPipeline(range(10))
+
+    assert pipeline.collect() == 5
+    assert pipeline.chunks == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+    assert [row[0] for row in pipeline.results.iter_sorted_rows()] == [0, 2, 4, 6, 8]
+
+
+def test_producer_exception_reaches_collect():
+    pipeline = StreamPipeline(failing_after(4))
+
+    with pytest.raises(ValueError, match="listing failed"):
+        pipeline.collect()
+    assert producer_stopped()
+
+
+def test_consumer_exception_stops_the_producer():
+    # Far more chunks than the queue holds, so the producer would block on a full queue.
+    pipeline = StreamPipeline(range(1_000), fail_prefetch=True)
+
+    with pytest.raises(RuntimeError, match="prefetch failed"):
+        pipeline.collect()
+    assert producer_stopped()
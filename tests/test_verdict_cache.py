@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+import utils
+from pipelines.ec2_unused import EC2UnusedPipeline
+
+
+def test_verdicts_round_trip_until_fingerprint_or_expiry_changes(tmp_path):
+    cache = utils.VerdictCache(tmp_path / "verdicts.sqlite")
+    valid_until = time.time() + 3600
+    cache.put("ec2:111:us-east-1", {
+        "i-a": ("fp-a", None, valid_until),
+        "i-b": ("fp-b", ["i-b", "IDLE"], valid_until),
+        "i-c": ("fp-c", None, time.time() - 1),
+    })
+
+    fingerprints = {"i-a": "fp-a", "i-b": "fp-b", "i-c": "fp-c"}
+    assert cache.get("ec2:111:us-east-1", fingerprints) == {"i-a": None, "i-b": ["i-b", "IDLE"]}
+    assert cache.get("ec2:111:us-east-1", {"i-a": "fp-a-changed"}) == {}
+    assert cache.get("ec2:222:us-east-1", fingerprints) == {}
+
+
+@pytest.mark.parametrize("setting, value", [
+    ("CPU_IDLE_THRESHOLD_PERCENTAGE", 10.0),
+    ("NET_IDLE_THRESHOLD_MB", 1.0),
+    ("VERDICT_THRESHOLD_MARGIN", 0.5),
+    ("LOOKBACK_DAYS", 7),
+])
+def test_ec2_fingerprint_changes_with_the_verdict_settings(monkeypatch, setting, value):
+    monkeypatch.setattr(utils, "get_client", lambda *args: None)
+    instance = {
+        "InstanceId": "i-a",
+        "InstanceType": "m5.large",
+        "State": {"Name": "running"},
+        "LaunchTime": "2024-01-01T00:00:00+00:00",
+    }
+    pipeline = EC2UnusedPipeline("111111111111", "us-east-1")
+    before = pipeline._fingerprint(instance)
+
+    monkeypatch.setattr(EC2UnusedPipeline.CONFIG, setting, value)
+
+    assert pipeline._fingerprint(instance) != before
@@ -1,13 +1,30 @@
+import os
+import re
 import csv
 import json
+import hashlib
+import time
+import random
+import heapq
+import fcntl
+import pickle
+import shutil
+import uuid
+import tempfile
 import boto3
-import gspread
+import sqlite3
+import threading
 import configparser
-import pandas as pd
+import botocore.session
+import botocore.loaders
 from pathlib import Path
-from datetime import datetime, timedelta
-from botocore.exceptions import ClientError
-from google.oauth2.service_account import Credentials
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple
+from multiprocessing.managers import BaseManager
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from botocore.config import Config
+from botocore.exceptions import ClientError, DataNotFoundError
+from botocore.credentials import CredentialProvider, DeferredRefreshableCredentials
 
 # -------------------------------------------
 # Logger
@@ -25,16 +42,133 @@ logger = logging.getLogger(__name__)
 # ----------------------
 from settings import CommonConfig
 
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# -------------------------------------------
+# Adaptive Rate Limiter
+# -------------------------------------------
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "SlowDown",
+}
+
+class AdaptiveRateLimiter:
+    """
+    AIMD token buckets, one per "<service>:<account>:<region>" key.
+
+    reserve() takes a token and returns how long the caller must wait for it, so the
+    limiter never blocks (it is served to every worker process by RateLimiterManager).
+    record() adapts the rate: throttling multiplies it by RATE_LIMIT_DECREASE_FACTOR,
+    throttle-free calls add about RATE_LIMIT_INCREASE_RPS per second.
+    """
+
+    def __init__(self):
+        self._buckets: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: str) -> dict:
+        if key not in self._buckets:
+            service = key.split(":", 1)[0]
+            rate = CommonConfig.RATE_LIMIT_INITIAL_RPS.get(service, CommonConfig.RATE_LIMIT_DEFAULT_RPS)
+            self._buckets[key] = {"rate": rate, "tokens": rate, "updated_at": time.monotonic(), "decreased_at": 0.0}
+        return self._buckets[key]
+
+    def reserve(self, key: str) -> float:
+        with self._lock:
+            bucket = self._bucket(key)
+            now = time.monotonic()
+
+            # Capacity is one second of traffic; tokens below zero are queued callers.
+            bucket["tokens"] = min(bucket["rate"], bucket["tokens"] + (now - bucket["updated_at"]) * bucket["rate"])
+            bucket["updated_at"] = now
+            bucket["tokens"] -= 1
+
+            return 0.0 if bucket["tokens"] >= 0 else -bucket["tokens"] / bucket["rate"]
+
+    def record(self, key: str, throttled: bool) -> None:
+        with self._lock:
+            bucket = self._bucket(key)
+            now = time.monotonic()
+
+            if throttled:
+                if now - bucket["decreased_at"] >= 1.0:
+                    bucket["rate"] = max(CommonConfig.RATE_LIMIT_MIN_RPS, bucket["rate"] * CommonConfig.RATE_LIMIT_DECREASE_FACTOR)
+                    bucket["decreased_at"] = now
+                    logger.info(f"Throttled on {key}, lowering the rate to {bucket['rate']:.1f} requests/second.")
+            else:
+                bucket["rate"] = min(CommonConfig.RATE_LIMIT_MAX_RPS, bucket["rate"] + CommonConfig.RATE_LIMIT_INCREASE_RPS / bucket["rate"])
+
+    def rates(self) -> dict[str, float]:
+        with self._lock:
+            return {key: bucket["rate"] for key, bucket in self._buckets.items()}
+
+
+class RateLimiterManager(BaseManager):
+    """
+    Serves one AdaptiveRateLimiter to every pipeline process (started by main).
+    """
+
+RateLimiterManager.register("AdaptiveRateLimiter", AdaptiveRateLimiter)
+
+_rate_limiter = None
+
+def set_rate_limiter(limiter) -> None:
+    """
+    ProcessPoolExecutor initializer: makes every process use the shared limiter.
+    """
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def get_rate_limiter():
+    global _rate_limiter
+
+    if _rate_limiter is None:
+        _rate_limiter = AdaptiveRateLimiter()
+    return _rate_limiter
+
+
+def install_rate_limiter(session: boto3.Session, scope: str) -> None:
+    """
+    Paces every request (retries included) of the session's clients through the
+    rate limiter and feeds each response back to it.
+    """
+    def limiter_key(event_name: str) -> str:
+        # Event names look like "before-send.<service id>.<operation>".
+        return f"{event_name.split('.')[1]}:{scope}"
+
+    def before_send(event_name: str, **kwargs):
+        delay = get_rate_limiter().reserve(limiter_key(event_name))
+        if delay > 0:
+            time.sleep(delay)
+
+    def needs_retry(event_name: str, response=None, **kwargs):
+        if response is None:
+            return
+        error_code = response[1].get("Error", {}).get("Code")
+        get_rate_limiter().record(limiter_key(event_name), error_code in THROTTLING_ERROR_CODES)
+
+    session.events.register("before-send", before_send)
+    session.events.register("needs-retry", needs_retry)
 
 # -------------------------------------------
 # AWS Boto3 Session
 # -------------------------------------------
-def create_boto3_session(credentials_file: Path = Path("./credentials")) -> boto3.Session:
+def create_boto3_session(credentials_file: Path = Path("./credentials"), region_name: str = None,
+                         botocore_session: botocore.session.Session = None) -> boto3.Session:
     """
     Create a boto3 session using a local credentials file if it exists,
     otherwise fall back to default AWS credential resolution.
     """
-    session_kwargs = {"region_name": CommonConfig.AWS_REGION}
+    session_kwargs = {"region_name": region_name or CommonConfig.AWS_REGION, "botocore_session": botocore_session}
 
     if credentials_file.exists():
         config = configparser.ConfigParser()
@@ -55,19 +189,1179 @@ def create_boto3_session(credentials_file: Path = Path("./credentials")) -> boto
 
     return boto3.Session(**session_kwargs)
 
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_shared_loader = None
+_account_credentials = {}
+_home_account_id = None
+
+def get_shared_loader() -> botocore.loaders.Loader:
+    """
+    Returns the process-wide botocore data loader. Every session uses it, so each
+    service model is read and parsed once per process instead of once per session.
+    """
+    global _shared_loader
+
+    if _shared_loader is None:
+        _shared_loader = botocore.loaders.create_loader()
+    return _shared_loader
+
+
+def preload_service_models(service_names: list[str]) -> None:
+    """
+    Parses the given services' models (and the shared endpoint and retry data) into
+    the shared loader's cache.
+    """
+    loader = get_shared_loader()
+
+    for data_name in ["endpoints", "partitions", "_retry", "sdk-default-configuration"]:
+        loader.load_data(data_name)
+
+    for service_name in service_names:
+        for type_name in ["service-2", "endpoint-rule-set-1", "paginators-1"]:
+            try:
+                loader.load_service_model(service_name, type_name)
+            except DataNotFoundError:
+                pass
+
+
+def get_home_account_id() -> str:
+    """
+    Returns the account of the local credentials (looked up once per process).
+    """
+    global _home_account_id
+
+    if _home_account_id is None:
+        sts = get_client("sts")
+        _home_account_id = sts.get_caller_identity()["Account"]
+    return _home_account_id
+
+
+def _get_assumed_role_credentials(account_id: str) -> DeferredRefreshableCredentials:
+    """
+    Returns the cached credentials for the organization role in an account. They are
+    first assumed on use and refreshed by botocore shortly before they expire.
+    """
+    with _sessions_lock:
+        if account_id in _account_credentials:
+            return _account_credentials[account_id]
+
+        sts = create_boto3_session().client("sts")
+        role_arn = f"arn:aws:iam::{account_id}:role/{CommonConfig.ORGANIZATION_ROLE_NAME}"
+
+        def refresh() -> dict:
+            logger.debug(f"Assuming {role_arn}.")
+            credentials = sts.assume_role(
+                RoleArn=role_arn,
+                RoleSessionName="aws-costwatch",
+                DurationSeconds=CommonConfig.ORGANIZATION_ROLE_SESSION_SECONDS,
+            )["Credentials"]
+            return {
+                "access_key": credentials["AccessKeyId"],
+                "secret_key": credentials["SecretAccessKey"],
+                "token": credentials["SessionToken"],
+                "expiry_time": credentials["Expiration"].isoformat(),
+            }
+
+        _account_credentials[account_id] = DeferredRefreshableCredentials(refresh, method="sts-assume-role")
+        return _account_credentials[account_id]
+
+
+class AssumedRoleCredentialProvider(CredentialProvider):
+    """
+    Resolves a session's credentials to the organization role in one account (see
+    _get_assumed_role_credentials), ahead of the environment and config providers.
+    """
+
+    METHOD = "costwatch-assume-role"
+    CANONICAL_NAME = "CostwatchAssumeRole"
+
+    def __init__(self, account_id: str):
+        super().__init__()
+        self.account_id = account_id
+
+    def load(self) -> DeferredRefreshableCredentials:
+        return _get_assumed_role_credentials(self.account_id)
+
+
+def get_boto3_session(region_name: str = None, account_id: str = None) -> boto3.Session:
+    """
+    Returns the process-wide session for an account and region, so every pipeline in
+    the process reuses the same credentials and client configuration.
+
+    Without an account id (or for the home account) the local credentials are used;
+    other accounts go through the assumed organization role.
+    """
+    region_name = region_name or CommonConfig.AWS_REGION
+    if account_id is not None and account_id == get_home_account_id():
+        account_id = None
+
+    key = (account_id, region_name)
+    if key in _sessions:
+        return _sessions[key]
+
+    botocore_session = botocore.session.Session()
+    if account_id is None:
+        session = create_boto3_session(region_name=region_name, botocore_session=botocore_session)
+    else:
+        resolver = botocore_session.get_component("credential_provider")
+        resolver.insert_before("env", AssumedRoleCredentialProvider(account_id))
+        session = boto3.Session(botocore_session=botocore_session, region_name=region_name)
+
+    # Registered after boto3 set the session up, so boto3 does not extend the shared loader.
+    botocore_session.register_component("data_loader", get_shared_loader())
+
+    if CommonConfig.RATE_LIMIT_ENABLED:
+        install_rate_limiter(session, f"{account_id or 'home'}:{region_name}")
+
+    with _sessions_lock:
+        return _sessions.setdefault(key, session)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def client_config() -> Config:
+    """
+    Transport settings shared by every client: a connection pool large enough for the
+    configured concurrency, TCP keep-alive, retries and timeouts. With the shared rate
+    limiter installed, botocore's own client-side rate limiting ("adaptive" retries)
+    is replaced by "standard" retries so the two do not both back off.
+    """
+    retry_mode = "standard" if CommonConfig.RATE_LIMIT_ENABLED else CommonConfig.AWS_RETRY_MODE
+    return Config(
+        max_pool_connections=CommonConfig.MAX_WORKERS,
+        tcp_keepalive=True,
+        retries={"mode": retry_mode, "max_attempts": CommonConfig.AWS_MAX_ATTEMPTS},
+        connect_timeout=CommonConfig.AWS_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=CommonConfig.AWS_READ_TIMEOUT_SECONDS,
+    )
+
+
+def get_client(service_name: str, region_name: str = None, account_id: str = None):
+    """
+    Returns the process-wide client for a service, region and account. Clients are
+    thread-safe and created once, so every pipeline and unit in the process shares
+    their service model, connection pool and retry state.
+    """
+    region_name = region_name or CommonConfig.AWS_REGION
+    if account_id is not None and account_id == get_home_account_id():
+        account_id = None
+    key = (service_name, region_name, account_id)
+
+    if key in _clients:
+        return _clients[key]
+
+    # Session.client() is not thread-safe, so clients are created one at a time.
+    with _clients_lock:
+        if key not in _clients:
+            session = get_boto3_session(region_name, account_id)
+            _clients[key] = session.client(service_name, config=client_config())
+        return _clients[key]
+
+
+def resolve_accounts() -> list[str]:
+    """
+    Returns the accounts to scan: the home account, or in organization mode
+    ORGANIZATION_ACCOUNT_IDS / every ACTIVE account of the organization.
+    """
+    if not CommonConfig.ORGANIZATION_MODE:
+        return [get_home_account_id()]
+
+    if CommonConfig.ORGANIZATION_ACCOUNT_IDS:
+        return list(CommonConfig.ORGANIZATION_ACCOUNT_IDS)
+
+    organizations = get_client("organizations")
+    paginator = organizations.get_paginator("list_accounts")
+
+    account_ids = []
+    for page in paginator.paginate():
+        account_ids.extend(account["Id"] for account in page.get("Accounts", []) if account["Status"] == "ACTIVE")
+
+    return sorted(account_ids)
+
+
+def resolve_regions() -> list[str]:
+    """
+    Returns the regions to scan: CommonConfig.AWS_REGIONS, or every region enabled for
+    the account when it is "all".
+    """
+    if CommonConfig.AWS_REGIONS != "all":
+        return list(CommonConfig.AWS_REGIONS)
+
+    ec2 = get_client("ec2")
+    response = ec2.describe_regions(
+        Filters=[{"Name": "opt-in-status", "Values": ["opt-in-not-required", "opted-in"]}],
+    )
+    return sorted(region["RegionName"] for region in response.get("Regions", []))
+
+# -------------------------------------------
+# CloudWatch GetMetricData Batcher
+# -------------------------------------------
+class MetricSeries(NamedTuple):
+    timestamps: list[datetime]
+    values: list[float]
+
+
+class MetricStore:
+    """
+    SQLite store of CloudWatch datapoints per series (scope, namespace, metric,
+    dimensions, stat and period), so each run only fetches the tail it is missing.
+
+    A series' watermark (covered_from, covered_until) records the range whose
+    periods are complete and stored; a period without a datapoint inside it simply
+    had no data. prune() drops datapoints older than METRIC_STORE_RETENTION_DAYS;
+    main runs it once per run.
+    """
+
+    BATCH_SIZE = 500
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS datapoints ("
+                "series_key TEXT, ts INTEGER, value REAL, PRIMARY KEY (series_key, ts)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS watermarks ("
+                "series_key TEXT PRIMARY KEY, covered_from INTEGER, covered_until INTEGER) WITHOUT ROWID"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _select(self, conn: sqlite3.Connection, sql: str, series_keys: list[str]) -> list[tuple]:
+        rows = []
+        for i in range(0, len(series_keys), self.BATCH_SIZE):
+            batch = series_keys[i:i + self.BATCH_SIZE]
+            placeholders = ", ".join("?" for _ in batch)
+            rows.extend(conn.execute(sql.format(placeholders=placeholders), batch).fetchall())
+        return rows
+
+    def get_watermarks(self, series_keys: list[str]) -> dict[str, tuple[int, int]]:
+        conn = self._connect()
+        try:
+            rows = self._select(
+                conn,
+                "SELECT series_key, covered_from, covered_until FROM watermarks WHERE series_key IN ({placeholders})",
+                series_keys,
+            )
+        finally:
+            conn.close()
+
+        return {series_key: (covered_from, covered_until) for series_key, covered_from, covered_until in rows}
+
+    def get_points(self, series_keys: list[str]) -> dict[str, list[tuple[int, float]]]:
+        conn = self._connect()
+        try:
+            rows = self._select(
+                conn,
+                "SELECT series_key, ts, value FROM datapoints WHERE series_key IN ({placeholders}) ORDER BY series_key, ts",
+                series_keys,
+            )
+        finally:
+            conn.close()
+
+        points: dict[str, list[tuple[int, float]]] = {}
+        for series_key, ts, value in rows:
+            points.setdefault(series_key, []).append((ts, value))
+        return points
+
+    def put(self, points: dict[str, list[tuple[int, float]]], watermarks: dict[str, tuple[int, int]]) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO datapoints VALUES (?, ?, ?)",
+                    [(series_key, ts, value) for series_key, series_points in points.items() for ts, value in series_points],
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?)",
+                    [(series_key, covered_from, covered_until) for series_key, (covered_from, covered_until) in watermarks.items()],
+                )
+        finally:
+            conn.close()
+
+    def prune(self) -> None:
+        cutoff = int(time.time()) - CommonConfig.METRIC_STORE_RETENTION_DAYS * 86400
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM datapoints WHERE ts < ?", (cutoff,))
+                conn.execute("UPDATE watermarks SET covered_from = ? WHERE covered_from < ?", (cutoff, cutoff))
+        finally:
+            conn.close()
+
+
+_metric_store = None
+_metric_store_lock = threading.Lock()
+
+def get_metric_store() -> MetricStore:
+    global _metric_store
+
+    with _metric_store_lock:
+        if _metric_store is None:
+            _metric_store = MetricStore(CommonConfig.METRIC_STORE_PATH)
+        return _metric_store
+
+
+class MetricDataBatcher:
+    """
+    Collects GetMetricData queries from many resources and sends them packed
+    into calls of up to 500 queries, following NextToken pagination.
+
+    With a MetricStore, window starts are aligned to the period, only the part of
+    each series after its stored watermark is requested (queries sharing a start
+    time share calls), and the complete periods fetched are stored for later runs.
+    Returned series still start at start_time.
+    The scope (account and region) keeps series of different accounts apart.
+
+    Usage:
+        batcher.add(key, label, namespace, metric_name, dimensions, period, stat)
+        results = batcher.execute()  # {key: {label: MetricSeries}}
+    """
+
+    MAX_QUERIES_PER_CALL = 500
+
+    def __init__(self, cw_client, start_time: datetime, end_time: datetime, scan_by: str = "TimestampAscending",
+                 store: MetricStore = None, scope: str = ""):
+        self.cw = cw_client
+        self.start_time = start_time
+        self.end_time = end_time
+        self.scan_by = scan_by
+        self.store = store
+        self.scope = scope
+
+        # Pending queries: (key, label, metric_stat)
+        self._queries: list[tuple[Any, str, dict]] = []
+
+    def add(self, key: Any, label: str, namespace: str, metric_name: str, dimensions: list[dict],
+            period: int, stat: str) -> None:
+        metric_stat = {
+            "Metric": {
+                "Namespace": namespace,
+                "MetricName": metric_name,
+                "Dimensions": dimensions,
+            },
+            "Period": period,
+            "Stat": stat,
+        }
+        self._queries.append((key, label, metric_stat))
+
+    def execute(self) -> dict[Any, dict[str, MetricSeries]]:
+        if self.store is None:
+            series = self._fetch(self._queries, self.start_time)
+        else:
+            series = self._fetch_with_store()
+
+        results: dict[Any, dict[str, MetricSeries]] = {}
+        for (key, label, _), query_series in zip(self._queries, series):
+            results.setdefault(key, {})[label] = query_series
+
+        logger.debug(f"Fetched {len(self._queries)} metric queries in batches of {self.MAX_QUERIES_PER_CALL}.")
+        self._queries = []
+        return results
+
+    def _series_key(self, metric_stat: dict) -> str:
+        metric = metric_stat["Metric"]
+        dimensions = sorted((d["Name"], d["Value"]) for d in metric["Dimensions"])
+        return json.dumps(
+            [self.scope, metric["Namespace"], metric["MetricName"], dimensions, metric_stat["Stat"], metric_stat["Period"]]
+        )
+
+    def _fetch_with_store(self) -> list[MetricSeries]:
+        series_keys = [self._series_key(metric_stat) for _, _, metric_stat in self._queries]
+        watermarks = self.store.get_watermarks(list(set(series_keys)))
+        window_start = int(self.start_time.timestamp())
+        settled_until = int(self.end_time.timestamp()) - CommonConfig.METRIC_STORE_SETTLE_MINUTES * 60
+
+        # Fetch start per query: the stored watermark, or the aligned window start.
+        aligned_starts, fetch_starts, groups = [], [], {}
+        for index, (series_key, (_, _, metric_stat)) in enumerate(zip(series_keys, self._queries)):
+            period = metric_stat["Period"]
+            aligned_start = window_start // period * period
+
+            covered_from, covered_until = watermarks.get(series_key, (None, None))
+            if covered_from is not None and covered_from <= aligned_start < covered_until:
+                fetch_start = covered_until
+            else:
+                fetch_start = aligned_start
+
+            aligned_starts.append(aligned_start)
+            fetch_starts.append(fetch_start)
+            groups.setdefault(fetch_start, []).append(index)
+
+        fetched: list[MetricSeries] = [None] * len(self._queries)
+        for fetch_start, indexes in groups.items():
+            start_time = datetime.fromtimestamp(fetch_start, timezone.utc)
+            for index, query_series in zip(indexes, self._fetch([self._queries[i] for i in indexes], start_time)):
+                fetched[index] = query_series
+
+        reused_keys = [series_keys[i] for i in range(len(series_keys)) if fetch_starts[i] > aligned_starts[i]]
+        stored = self.store.get_points(list(set(reused_keys)))
+
+        series, new_points, new_watermarks = [], {}, {}
+        for index, (series_key, (_, _, metric_stat)) in enumerate(zip(series_keys, self._queries)):
+            period = metric_stat["Period"]
+            aligned_start, fetch_start = aligned_starts[index], fetch_starts[index]
+
+            points = [(ts, value) for ts, value in stored.get(series_key, []) if aligned_start <= ts < fetch_start]
+            fresh = [(int(ts.timestamp()), value) for ts, value in zip(fetched[index].timestamps, fetched[index].values)]
+            # The aligned start only serves the store; the caller's window starts at start_time.
+            points = sorted(
+                [(ts, value) for ts, value in points + fresh if ts >= window_start],
+                reverse=self.scan_by == "TimestampDescending",
+            )
+
+            series.append(MetricSeries(
+                [datetime.fromtimestamp(ts, timezone.utc) for ts, _ in points],
+                [value for _, value in points],
+            ))
+
+            # Only periods that ended before the settle delay are final.
+            complete_until = settled_until // period * period
+            if complete_until > fetch_start:
+                covered_from = watermarks[series_key][0] if fetch_start > aligned_start else aligned_start
+                new_points[series_key] = [(ts, value) for ts, value in fresh if ts + period <= complete_until]
+                new_watermarks[series_key] = (covered_from, complete_until)
+
+        self.store.put(new_points, new_watermarks)
+        logger.debug(f"Fetched {len(self._queries)} metric series, {len(reused_keys)} from the local store.")
+        return series
+
+    def _fetch(self, queries: list[tuple[Any, str, dict]], start_time: datetime) -> list[MetricSeries]:
+        series = [MetricSeries([], []) for _ in queries]
+
+        for start in range(0, len(queries), self.MAX_QUERIES_PER_CALL):
+            chunk = queries[start:start + self.MAX_QUERIES_PER_CALL]
+
+            # Query Ids only need to be unique within a single call.
+            id_map = {}
+            metric_data_queries = []
+            for index, (key, label, metric_stat) in enumerate(chunk):
+                query_id = f"q{index}"
+                id_map[query_id] = start + index
+                metric_data_queries.append({"Id": query_id, "MetricStat": metric_stat, "ReturnData": True})
+
+            request = {
+                "MetricDataQueries": metric_data_queries,
+                "StartTime": start_time,
+                "EndTime": self.end_time,
+                "ScanBy": self.scan_by,
+            }
+
+            while True:
+                resp = self.cw.get_metric_data(**request)
+
+                for result in resp.get("MetricDataResults", []):
+                    query_series = series[id_map[result["Id"]]]
+                    query_series.timestamps.extend(result.get("Timestamps", []))
+                    query_series.values.extend(result.get("Values", []))
+
+                next_token = resp.get("NextToken")
+                if not next_token:
+                    break
+                request["NextToken"] = next_token
+
+        return series
+
+# -------------------------------------------
+# Vectorized Metric Analysis
+# -------------------------------------------
+def metric_matrix(metrics: dict[Any, dict[str, MetricSeries]], keys: list, label: str) -> tuple["np.ndarray", list[datetime]]:
+    """
+    Stacks one label's series of many resources into a (resources x time) matrix on a
+    shared, sorted time axis; NaN marks a missing datapoint.
+    """
+    # Imported on use: only the pipelines with vectorized analysis need numpy.
+    import numpy as np
+
+    empty = MetricSeries([], [])
+    series = [metrics.get(key, {}).get(label) or empty for key in keys]
+
+    time_axis = sorted({ts for s in series for ts in s.timestamps})
+    column = {ts: i for i, ts in enumerate(time_axis)}
+
+    matrix = np.full((len(keys), len(time_axis)), np.nan)
+    for row, s in enumerate(series):
+        if s.timestamps:
+            matrix[row, [column[ts] for ts in s.timestamps]] = s.values
+
+    return matrix, time_axis
+
+
+def summarize_rows(matrix: "np.ndarray") -> dict[str, "np.ndarray"]:
+    """
+    Per-row count, sum, max and mean over the present datapoints (0 for empty rows).
+    """
+    import numpy as np
+
+    present = ~np.isnan(matrix)
+    count = present.sum(axis=1)
+    filled = np.where(present, matrix, 0.0)
+    has_data = count > 0
+
+    return {
+        "count": count,
+        "sum": filled.sum(axis=1),
+        "max": np.where(has_data, np.where(present, matrix, -np.inf).max(axis=1, initial=-np.inf), 0.0),
+        "mean": np.divide(filled.sum(axis=1), count, out=np.zeros(len(matrix)), where=has_data),
+    }
+
+
+def last_timestamps(mask: "np.ndarray", time_axis: list[datetime]) -> list[datetime | None]:
+    """
+    Per row, the timestamp of the last True cell of a (resources x time) mask.
+    """
+    import numpy as np
+
+    if mask.shape[1] == 0:
+        return [None] * mask.shape[0]
+
+    last_index = mask.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
+    return [time_axis[i] if found else None for i, found in zip(last_index, mask.any(axis=1))]
+
+# -------------------------------------------
+# CloudWatch Metrics Insights
+# -------------------------------------------
+def run_metrics_insights_query(cw_client, query: str, start_time: datetime, end_time: datetime,
+                               period: int) -> dict[str, MetricSeries]:
+    """
+    Runs a single Metrics Insights query and returns one series per GROUP BY label.
+    """
+    request = {
+        "MetricDataQueries": [{"Id": "q", "Expression": query, "Period": period, "ReturnData": True}],
+        "StartTime": start_time,
+        "EndTime": end_time,
+        "ScanBy": "TimestampAscending",
+    }
+
+    results: dict[str, MetricSeries] = {}
+    while True:
+        resp = cw_client.get_metric_data(**request)
+
+        for result in resp.get("MetricDataResults", []):
+            series = results.setdefault(result.get("Label", ""), MetricSeries([], []))
+            series.timestamps.extend(result.get("Timestamps", []))
+            series.values.extend(result.get("Values", []))
+
+        next_token = resp.get("NextToken")
+        if not next_token:
+            break
+        request["NextToken"] = next_token
+
+    return results
+
+def fetch_grouped_metrics(cw_client, queries: dict[str, str], keys: list[str], start_time: datetime,
+                          end_time: datetime, period: int, thresholds: dict[str, float],
+                          ) -> tuple[dict[str, dict[str, MetricSeries]], list[str], list[str]]:
+    """
+    Finds the idle candidates of a whole inventory with one Metrics Insights query per
+    label. Each query must GROUP BY the resource dimension and ORDER BY MAX() ASC, so
+    the LIMIT (appended here) keeps the lowest groups; thresholds holds each label's
+    busy threshold on that maximum.
+
+    Returns ({key: {label: MetricSeries}}, unresolved_keys, busy_keys). A key missing
+    from a query that was not truncated has no datapoints (an empty series). When a
+    truncated query's largest returned maximum already reaches the threshold, the keys
+    it left out are busy; otherwise they are unresolved and need per-resource queries.
+    """
+    if not keys:
+        return {}, [], []
+
+    limit = CommonConfig.METRICS_INSIGHTS_LIMIT
+    results = {key: {} for key in keys}
+    unresolved, busy = set(), set()
+
+    for label, query in queries.items():
+        groups = run_metrics_insights_query(cw_client, f"{query} LIMIT {limit}", start_time, end_time, period)
+
+        truncated = len(groups) >= limit
+        above = truncated and max(max(series.values, default=0.0) for series in groups.values()) >= thresholds[label]
+
+        for key in keys:
+            if key in groups:
+                results[key][label] = groups[key]
+            elif not truncated:
+                results[key][label] = MetricSeries([], [])
+            elif above:
+                busy.add(key)
+            else:
+                unresolved.add(key)
+
+    unresolved -= busy
+    logger.debug(f"Metrics Insights resolved {len(keys) - len(unresolved)} of {len(keys)} keys, {len(busy)} busy.")
+    resolved = {key: series for key, series in results.items() if key not in unresolved and key not in busy}
+    return resolved, [key for key in keys if key in unresolved], [key for key in keys if key in busy]
+
+# -------------------------------------------
+# Run Snapshots
+# -------------------------------------------
+RUN_ID_ENV = "COSTWATCH_RUN_ID"
+
+def start_run() -> str:
+    """
+    Starts a run: removes stale snapshot directories and publishes a fresh run id
+    through the environment, so processes started afterwards share its snapshots.
+    """
+    max_age = CommonConfig.RUN_SNAPSHOT_MAX_AGE_HOURS * 3600
+    if CommonConfig.RUN_SNAPSHOT_DIR.exists():
+        for run_dir in CommonConfig.RUN_SNAPSHOT_DIR.iterdir():
+            if time.time() - run_dir.stat().st_mtime > max_age:
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+    run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    os.environ[RUN_ID_ENV] = run_id
+    return run_id
+
+def end_run() -> None:
+    run_id = os.environ.pop(RUN_ID_ENV, None)
+    if run_id:
+        shutil.rmtree(CommonConfig.RUN_SNAPSHOT_DIR / run_id, ignore_errors=True)
+
+def get_run_id() -> str:
+    return os.environ.get(RUN_ID_ENV) or start_run()
+
+
+_run_snapshots = {}
+_run_snapshot_locks = {}
+_run_snapshots_lock = threading.Lock()
+
+def load_run_snapshot(name: str, build: Callable[[], Any]) -> Any:
+    """
+    Returns the run's snapshot called name, calling build() only in the first process
+    (and thread) that asks for it. The result is pickled under the run directory with
+    an atomic rename while an exclusive file lock is held; everyone else waits on the
+    lock and loads the file.
+    """
+    with _run_snapshots_lock:
+        lock = _run_snapshot_locks.setdefault(name, threading.Lock())
+
+    with lock:
+        if name in _run_snapshots:
+            return _run_snapshots[name]
+
+        run_dir = CommonConfig.RUN_SNAPSHOT_DIR / get_run_id()
+        run_dir.mkdir(parents=True, exist_ok=True)
+        path = run_dir / f"{name}.pkl"
+
+        with open(run_dir / f"{name}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not path.exists():
+                snapshot = build()
+                with tempfile.NamedTemporaryFile(dir=run_dir, suffix=".tmp", delete=False) as f:
+                    pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(f.name, path)
+                logger.info(f"Materialized run snapshot: {name}.")
+
+        with open(path, "rb") as f:
+            _run_snapshots[name] = pickle.load(f)
+
+        return _run_snapshots[name]
+
+
+class EC2Inventory:
+    """
+    Every instance, volume and Elastic IP of one account and region, listed once per
+    run and indexed for lookups by ID, by attached instance and by tag.
+    """
+
+    def __init__(self, instances: list[dict], volumes: list[dict], addresses: list[dict]):
+        self.instances = {instance["InstanceId"]: instance for instance in instances}
+        self.volumes = {volume["VolumeId"]: volume for volume in volumes}
+        self.addresses = addresses
+
+        self.volumes_by_instance: dict[str, list[dict]] = {}
+        for volume in volumes:
+            for attachment in volume.get("Attachments", []):
+                self.volumes_by_instance.setdefault(attachment["InstanceId"], []).append(volume)
+
+        self.addresses_by_instance: dict[str, list[dict]] = {}
+        for address in addresses:
+            if address.get("InstanceId"):
+                self.addresses_by_instance.setdefault(address["InstanceId"], []).append(address)
+
+        self.by_tag: dict[tuple[str, str], list[str]] = {}
+        for resource_id, resource in [*self.instances.items(), *self.volumes.items()]:
+            for tag in resource.get("Tags", []):
+                self.by_tag.setdefault((tag["Key"], tag["Value"]), []).append(resource_id)
+
+    @classmethod
+    def fetch(cls, ec2_client) -> "EC2Inventory":
+        filters = CommonConfig.INVENTORY_FILTERS
+
+        instances = [
+            instance
+            for page in ec2_client.get_paginator("describe_instances").paginate(Filters=filters.get("describe_instances", []))
+            for reservation in page.get("Reservations", [])
+            for instance in reservation.get("Instances", [])
+        ]
+        volumes = [
+            volume
+            for page in ec2_client.get_paginator("describe_volumes").paginate(Filters=filters.get("describe_volumes", []))
+            for volume in page.get("Volumes", [])
+        ]
+        addresses = ec2_client.describe_addresses(Filters=filters.get("describe_addresses", [])).get("Addresses", [])
+        return cls(instances, volumes, addresses)
+
+    def name_of(self, resource_id: str) -> str:
+        resource = self.instances.get(resource_id) or self.volumes.get(resource_id) or {}
+        return next((tag["Value"] for tag in resource.get("Tags", []) if tag["Key"] == "Name"), "")
+
+
+def get_ec2_inventory(ec2_client, account_id: str, region_name: str) -> EC2Inventory:
+    return load_run_snapshot(f"ec2-{account_id}-{region_name}", lambda: EC2Inventory.fetch(ec2_client))
+
 # -------------------------------------------
-# CSV Writer
+# Logs Insights Query Manager
 # -------------------------------------------
-def write_to_csv(file: str, row: list[str], mode: str):
-    Path(file).parent.mkdir(parents=True, exist_ok=True)
-    with open(file, mode, newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(row)
+class LogsInsightsQueryError(Exception):
+    pass
+
+
+class LogsInsightsQueryManager:
+    """
+    Runs Logs Insights queries for any caller with a bounded number in flight.
+
+    A single background thread starts queued queries as slots free up, polls every
+    running query in one loop with adaptive backoff (GetQueryResults calls are paced
+    to their TPS quota), and stops queries that pass their deadline or whose polling
+    fails. submit() returns a Future of the query's result rows.
+    """
+
+    FAILED_STATUSES = {"Failed", "Cancelled", "Timeout", "Unknown"}
+
+    def __init__(self, logs_client, max_concurrent: int = None, timeout_seconds: float = None):
+        self.logs = logs_client
+        self.max_concurrent = max_concurrent or CommonConfig.LOGS_INSIGHTS_MAX_CONCURRENT_QUERIES
+        self.timeout_seconds = timeout_seconds or CommonConfig.LOGS_INSIGHTS_QUERY_TIMEOUT_SECONDS
+        self._poll_bucket = TokenBucket(CommonConfig.LOGS_INSIGHTS_GET_RESULTS_TPS, per_seconds=1.0)
+
+        self._condition = threading.Condition()
+        self._queued: list[tuple[dict, Future]] = []
+        self._running: dict[str, tuple[Future, float]] = {}  # query_id -> (future, deadline)
+        self._thread = None
+
+    def submit(self, query_string: str, log_group_names: list[str], start_time: datetime,
+               end_time: datetime) -> Future:
+        request = {
+            "logGroupNames": log_group_names,
+            "startTime": int(start_time.timestamp()),
+            "endTime": int(end_time.timestamp()),
+            "queryString": query_string,
+        }
+        future = Future()
+
+        with self._condition:
+            self._queued.append((request, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="logs-insights-manager", daemon=True)
+                self._thread.start()
+            if len(self._running) < self.max_concurrent:
+                self._condition.notify()
+
+        return future
+
+    # ----------------------
+    # Internal helpers
+    # ----------------------
+    def _run(self):
+        delay = CommonConfig.LOGS_INSIGHTS_POLL_MIN_SECONDS
+
+        while True:
+            with self._condition:
+                while not self._queued and not self._running:
+                    self._condition.wait()
+
+            throttled = self._start_queued()
+            finished = self._poll_running()
+
+            if finished and not throttled:
+                delay = CommonConfig.LOGS_INSIGHTS_POLL_MIN_SECONDS
+            else:
+                delay = min(delay * 1.5, CommonConfig.LOGS_INSIGHTS_POLL_MAX_SECONDS)
+
+            with self._condition:
+                # submit() wakes the loop early when a slot is free.
+                self._condition.wait(timeout=delay)
+
+    def _start_queued(self) -> bool:
+        """
+        Returns True when the account's concurrent query limit pushed back.
+        """
+        while True:
+            with self._condition:
+                if not self._queued or len(self._running) >= self.max_concurrent:
+                    return False
+                request, future = self._queued.pop(0)
+
+            try:
+                query_id = self.logs.start_query(**request)["queryId"]
+            except self.logs.exceptions.LimitExceededException:
+                with self._condition:
+                    self._queued.insert(0, (request, future))
+                return True
+            except Exception as exception:
+                future.set_exception(exception)
+                continue
+
+            with self._condition:
+                self._running[query_id] = (future, time.monotonic() + self.timeout_seconds)
+
+    def _poll_running(self) -> int:
+        with self._condition:
+            running = list(self._running.items())
+
+        finished = 0
+        for query_id, (future, deadline) in running:
+            self._poll_bucket.acquire()
+            try:
+                result = self.logs.get_query_results(queryId=query_id)
+            except Exception as exception:
+                self._stop(query_id)
+                self._finish(query_id)
+                future.set_exception(exception)
+                finished += 1
+                continue
+
+            status = result["status"]
+            if status == "Complete":
+                self._finish(query_id)
+                future.set_result(result.get("results", []))
+                finished += 1
+            elif status in self.FAILED_STATUSES:
+                self._finish(query_id)
+                future.set_exception(LogsInsightsQueryError(f"Query {query_id} ended with status {status}."))
+                finished += 1
+            elif time.monotonic() > deadline:
+                self._stop(query_id)
+                self._finish(query_id)
+                future.set_exception(TimeoutError(f"Query {query_id} exceeded {self.timeout_seconds} seconds."))
+                finished += 1
+
+        return finished
+
+    def _stop(self, query_id: str):
+        try:
+            self.logs.stop_query(queryId=query_id)
+        except Exception:
+            logger.debug(f"Could not stop Logs Insights query {query_id}.")
+
+    def _finish(self, query_id: str):
+        with self._condition:
+            self._running.pop(query_id, None)
+
+
+def split_time_range(start_time: datetime, end_time: datetime, slices: int) -> list[tuple[datetime, datetime]]:
+    """
+    Splits [start_time, end_time] into consecutive sub-windows on whole seconds. Logs
+    Insights treats both ends as inclusive, so each window ends one second before
+    the next one starts.
+    """
+    start = int(start_time.timestamp())
+    end = int(end_time.timestamp())
+    bounds = [start + (end - start) * i // slices for i in range(slices)] + [end + 1]
+
+    return [
+        (datetime.fromtimestamp(lower, timezone.utc), datetime.fromtimestamp(upper - 1, timezone.utc))
+        for lower, upper in zip(bounds, bounds[1:])
+        if upper > lower
+    ]
+
+def merge_partial_aggregates(partials: list[dict[str, float]]) -> dict[str, float]:
+    """
+    Combines partial aggregates named sum_*, count_*, max_* and min_* into one, and
+    derives avg_<x> from sum_<x> / count_<x>.
+    """
+    merged: dict[str, float] = {}
+    for partial in partials:
+        for field, value in partial.items():
+            if field not in merged:
+                merged[field] = value
+            elif field.startswith("max_"):
+                merged[field] = max(merged[field], value)
+            elif field.startswith("min_"):
+                merged[field] = min(merged[field], value)
+            else:
+                merged[field] += value
+
+    for field in [field for field in merged if field.startswith("sum_")]:
+        name = field[len("sum_"):]
+        count = merged.get(f"count_{name}", 0)
+        merged[f"avg_{name}"] = merged[field] / count if count else 0.0
+
+    return merged
+
+
+class DailyPartialsCache:
+    """
+    SQLite store of per-log-group, per-day partial aggregates (see
+    merge_partial_aggregates), so closed days are only ever queried once.
+
+    Entries are scoped by a namespace (region, query fingerprint, ...); an empty
+    partial records a day without matching events.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS daily_partials ("
+                "namespace TEXT, log_group TEXT, day TEXT, partial TEXT, "
+                "PRIMARY KEY (namespace, log_group, day)) WITHOUT ROWID"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, namespace: str, days: list[str]) -> dict[tuple[str, str], dict]:
+        placeholders = ", ".join("?" for _ in days)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT log_group, day, partial FROM daily_partials WHERE namespace = ? AND day IN ({placeholders})",
+                (namespace, *days),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        return {(log_group, day): json.loads(partial) for log_group, day, partial in rows}
+
+    def put(self, namespace: str, partials: dict[tuple[str, str], dict]) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO daily_partials VALUES (?, ?, ?, ?)",
+                    [(namespace, log_group, day, json.dumps(partial)) for (log_group, day), partial in partials.items()],
+                )
+        finally:
+            conn.close()
+
+    def prune(self, namespace: str, before_day: str) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM daily_partials WHERE namespace = ? AND day < ?", (namespace, before_day))
+        finally:
+            conn.close()
+
+
+_logs_query_managers = {}
+_logs_query_managers_lock = threading.Lock()
+
+def get_logs_query_manager(logs_client, account_id: str = None) -> LogsInsightsQueryManager:
+    """
+    Returns the process-wide query manager for the client's account and region, so
+    every pipeline shares the same concurrent-query budget.
+    """
+    key = (account_id, logs_client.meta.region_name)
+
+    with _logs_query_managers_lock:
+        if key not in _logs_query_managers:
+            _logs_query_managers[key] = LogsInsightsQueryManager(logs_client)
+        return _logs_query_managers[key]
+
+# -------------------------------------------
+# Result Sink
+# -------------------------------------------
+class ResultSink:
+    """
+    Thread-safe, column-oriented buffer for a pipeline's result rows.
+
+    Values are kept as the Python types the pipeline produced. Once spill_rows are
+    buffered, a background thread sorts the batch and spills it to a temporary run
+    file, so memory stays bounded; the sorted output merges the runs with the
+    in-memory remainder. The CSV is written once, at the end.
+    """
+
+    def __init__(self, columns: list[str], sort_by: str, ascending: bool = True,
+                 spill_rows: int = CommonConfig.RESULT_SPILL_ROWS):
+        self.columns = list(columns)
+        self.sort_index = self.columns.index(sort_by)
+        self.ascending = ascending
+        self.spill_rows = spill_rows
+
+        self._lock = threading.Lock()
+        self._buffer: list[list] = [[] for _ in self.columns]
+        self._count = 0
+        self._runs: list[Path] = []
+        self._spills: list[Future] = []
+        self._executor = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, row: list) -> None:
+        if len(row) != len(self.columns):
+            raise ValueError(f"Expected {len(self.columns)} values, got {len(row)}: {row}")
+
+        with self._lock:
+            for column, value in zip(self._buffer, row):
+                column.append(value)
+            self._count += 1
+
+            if len(self._buffer[0]) >= self.spill_rows:
+                batch, self._buffer = self._buffer, [[] for _ in self.columns]
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="result-spill")
+                self._spills.append(self._executor.submit(self._spill, batch))
+
+    def iter_sorted_rows(self):
+        for spill in self._spills:
+            spill.result()
+
+        with self._lock:
+            in_memory = self._sorted(list(zip(*self._buffer)))
+            runs = list(self._runs)
+
+        if not runs:
+            yield from in_memory
+            return
+
+        yield from heapq.merge(*(self._read_run(run) for run in runs), in_memory,
+                               key=self._sort_key, reverse=not self.ascending)
+
+    def write_csv(self, path: Path) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.columns)
+            writer.writerows(self.iter_sorted_rows())
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+        for run in self._runs:
+            run.unlink(missing_ok=True)
+
+    # ----------------------
+    # Internal helpers
+    # ----------------------
+    def _sort_key(self, row: tuple):
+        # Empty values go last in both directions, like pandas' na_position="last".
+        value = row[self.sort_index]
+        is_missing = value is None or value == ""
+        return (is_missing if self.ascending else not is_missing, 0 if is_missing else value)
+
+    def _sorted(self, rows: list[tuple]) -> list[tuple]:
+        return sorted(rows, key=self._sort_key, reverse=not self.ascending)
+
+    def _spill(self, batch: list[list]) -> None:
+        rows = self._sorted(list(zip(*batch)))
+
+        with tempfile.NamedTemporaryFile(prefix="costwatch-run-", suffix=".pkl", delete=False) as f:
+            for i in range(0, len(rows), 1000):
+                pickle.dump(rows[i:i + 1000], f)
+
+        with self._lock:
+            self._runs.append(Path(f.name))
+
+    def _read_run(self, run: Path):
+        with open(run, "rb") as f:
+            while True:
+                try:
+                    yield from pickle.load(f)
+                except EOFError:
+                    return
+
+# -------------------------------------------
+# Verdict Cache
+# -------------------------------------------
+def fingerprint(*values) -> str:
+    """
+    Short, stable hash of JSON-serializable values (datetimes are stringified).
+    """
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class VerdictCache:
+    """
+    SQLite store of per-resource verdicts, so a resource is only re-evaluated when its
+    inventory fingerprint changes or its verdict expires.
+
+    Entries are scoped by a namespace (pipeline, account, region). A verdict is any
+    JSON value the pipeline can replay (e.g. its report row, or None for "not
+    reported"); valid_until is a Unix timestamp.
+    """
+
+    BATCH_SIZE = 500
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                "namespace TEXT, resource_id TEXT, fingerprint TEXT, verdict TEXT, valid_until REAL, "
+                "PRIMARY KEY (namespace, resource_id)) WITHOUT ROWID"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, namespace: str, fingerprints: dict[str, str]) -> dict[str, Any]:
+        """
+        Returns the unexpired verdicts whose fingerprint still matches.
+        """
+        resource_ids = list(fingerprints)
+        now = time.time()
+        verdicts = {}
+
+        conn = self._connect()
+        try:
+            for i in range(0, len(resource_ids), self.BATCH_SIZE):
+                batch = resource_ids[i:i + self.BATCH_SIZE]
+                placeholders = ", ".join("?" for _ in batch)
+                rows = conn.execute(
+                    f"SELECT resource_id, fingerprint, verdict FROM verdicts "
+                    f"WHERE namespace = ? AND valid_until > ? AND resource_id IN ({placeholders})",
+                    (namespace, now, *batch),
+                ).fetchall()
+
+                for resource_id, resource_fingerprint, verdict in rows:
+                    if resource_fingerprint == fingerprints[resource_id]:
+                        verdicts[resource_id] = json.loads(verdict)
+        finally:
+            conn.close()
+
+        return verdicts
+
+    def put(self, namespace: str, verdicts: dict[str, tuple[str, Any, float]]) -> None:
+        """
+        Stores {resource_id: (fingerprint, verdict, valid_until)} and drops expired entries.
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (namespace, resource_id, resource_fingerprint, json.dumps(verdict, default=str), valid_until)
+                        for resource_id, (resource_fingerprint, verdict, valid_until) in verdicts.items()
+                    ],
+                )
+                conn.execute("DELETE FROM verdicts WHERE namespace = ? AND valid_until <= ?", (namespace, time.time()))
+        finally:
+            conn.close()
 
 # -------------------------------------------
 # Google Sheet Functions
 # -------------------------------------------
 def get_gspread_client():
+    # Imported on use: most runs (and every pipeline process) never touch the GSheet.
+    import gspread
+    from google.oauth2.service_account import Credentials
+
     creds = Credentials.from_service_account_file(
         CommonConfig.GCC_JSON_PATH,
         scopes=[
@@ -77,11 +1371,6 @@ def get_gspread_client():
     )
     return gspread.authorize(creds)
 
-def get_worksheet(worksheet_name: str):
-    gc = get_gspread_client()
-    sheet = gc.open(CommonConfig.SPREADSHEET_NAME)
-    return sheet.worksheet(worksheet_name)
-
 def col_num_to_letter(n: int) -> str:
     result = ""
     while n > 0:
@@ -89,17 +1378,552 @@ def col_num_to_letter(n: int) -> str:
         result = chr(65 + remainder) + result
     return result
 
-def write_df_to_sheet(worksheet_name: str, df: pd.DataFrame):
-    worksheet = get_worksheet(worksheet_name)
-    values = df.values.tolist()
-    num_columns = len(values[0])
-    end_row = 2 + len(values) - 1
-    end_col = col_num_to_letter(num_columns)
-    clear_range = f"A2:{end_col}"
-    cell_range = f"A2:{end_col}{end_row}"
+def a1_range(worksheet_name: str, first_row: int, last_row: int, num_columns: int) -> str:
+    quoted_name = worksheet_name.replace("'", "''")
+    return f"'{quoted_name}'!A{first_row}:{col_num_to_letter(num_columns)}{last_row}"
+
+
+class TokenBucket:
+    """
+    Blocking token bucket: allows `rate` acquisitions per `per_seconds`, with bursts
+    of up to `rate`.
+    """
+
+    def __init__(self, rate: float, per_seconds: float = 60.0):
+        self.capacity = rate
+        self.fill_rate = rate / per_seconds
+        self.tokens = rate
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.fill_rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
 
-    worksheet.batch_clear([clear_range])
-    worksheet.update(cell_range, values, value_input_option="USER_ENTERED")
+            time.sleep(wait)
+
+
+class SheetPublisher:
+    """
+    Publishes every report CSV (header included) to its worksheet.
+
+    Authorizes and opens the spreadsheet once and streams each CSV row by row, sending
+    only the row ranges that changed since the last publish. Changed ranges go out in
+    values.batchUpdate calls of at most SHEETS_CHUNK_ROWS rows, paced by a token bucket
+    and retried with exponential backoff on quota (429) and server errors. Reports
+    larger than SHEETS_MAX_CELLS_PER_WORKSHEET roll over into numbered overflow
+    worksheets, each with its own header row. The grids of all worksheets, reports
+    or not, must fit in SHEETS_MAX_CELLS_PER_SPREADSHEET; a publish that would not
+    fails before anything is written.
+
+    Row hashes of the last publish are kept in SHEETS_STATE_PATH; worksheets without a
+    recorded state are cleared and written in full.
+    """
+
+    RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, state_path: Path = CommonConfig.SHEETS_STATE_PATH):
+        self.state_path = state_path
+        self.bucket = TokenBucket(CommonConfig.SHEETS_WRITE_REQUESTS_PER_MINUTE)
+        self.spreadsheet = None
+
+        # Pending values.batchUpdate payload
+        self._data: list[dict] = []
+        self._data_rows = 0
+
+    def publish(self, reports: dict[str, Path]) -> None:
+        self.spreadsheet = get_gspread_client().open(CommonConfig.SPREADSHEET_NAME)
+        worksheets = {worksheet.title: worksheet for worksheet in self.spreadsheet.worksheets()}
+
+        state = self._load_state()
+        sheet_state = state.setdefault(CommonConfig.SPREADSHEET_NAME, {})
+
+        # Pass 1: size every report so worksheets can be created or grown in one call.
+        layouts = {name: self._layout(csv_path) for name, csv_path in reports.items()}
+
+        # Grid cells per worksheet once the structure requests are applied.
+        cells = {worksheet.title: worksheet.row_count * worksheet.col_count for worksheet in worksheets.values()}
+
+        structure_requests, clear_ranges = [], []
+        for worksheet_name, (width, total_rows, rows_per_part) in layouts.items():
+            previous = sheet_state.get(worksheet_name, {})
+            part_count = max(1, -(-total_rows // rows_per_part))
+
+            for part in range(part_count):
+                part_name = self._part_name(worksheet_name, part)
+                part_rows = 1 + min(rows_per_part, total_rows - part * rows_per_part)
+                worksheet = worksheets.get(part_name)
+
+                if worksheet is None:
+                    cells[part_name] = part_rows * width
+                    structure_requests.append({
+                        "addSheet": {
+                            "properties": {
+                                "title": part_name,
+                                "gridProperties": {"rowCount": part_rows, "columnCount": width},
+                            },
+                        },
+                    })
+                    self._forget_part(previous, part)
+                    continue
+
+                if worksheet.row_count < part_rows or worksheet.col_count < width:
+                    cells[part_name] = max(worksheet.row_count, part_rows) * max(worksheet.col_count, width)
+                    structure_requests.append({
+                        "updateSheetProperties": {
+                            "properties": {
+                                "sheetId": worksheet.id,
+                                "gridProperties": {
+                                    "rowCount": max(worksheet.row_count, part_rows),
+                                    "columnCount": max(worksheet.col_count, width),
+                                },
+                            },
+                            "fields": "gridProperties(rowCount,columnCount)",
+                        },
+                    })
+
+                if part >= len(previous.get("parts", [])):
+                    clear_ranges.append("'{}'".format(part_name.replace("'", "''")))
+
+        total_cells = sum(cells.values())
+        if total_cells > CommonConfig.SHEETS_MAX_CELLS_PER_SPREADSHEET:
+            raise ValueError(
+                f"Publishing needs {total_cells:,} cells in {CommonConfig.SPREADSHEET_NAME}, over the "
+                f"{CommonConfig.SHEETS_MAX_CELLS_PER_SPREADSHEET:,} cell limit of a spreadsheet. "
+                f"Delete or shrink unused worksheets first."
+            )
+
+        if structure_requests:
+            self._call(self.spreadsheet.batch_update, {"requests": structure_requests})
+        if clear_ranges:
+            self._call(self.spreadsheet.values_batch_clear, body={"ranges": clear_ranges})
+
+        # Pass 2: stream the rows and send the changed ranges in chunks.
+        for worksheet_name, csv_path in reports.items():
+            width, _, rows_per_part = layouts[worksheet_name]
+            previous = sheet_state.get(worksheet_name, {})
+            sheet_state[worksheet_name] = self._publish_report(worksheet_name, csv_path, width, rows_per_part, previous)
+
+        self._flush()
+        self._save_state(state)
+        logger.info(f"Published {len(reports)} reports to {CommonConfig.SPREADSHEET_NAME}.")
+
+    # ----------------------
+    # Internal helpers
+    # ----------------------
+    def _layout(self, csv_path: Path) -> tuple[int, int, int]:
+        """
+        Returns (width, data rows, data rows per worksheet) of a report CSV.
+        """
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            width = len(next(reader, [])) or 1
+            total_rows = sum(1 for _ in reader)
+
+        rows_per_part = max(1, CommonConfig.SHEETS_MAX_CELLS_PER_WORKSHEET // width - 1)
+        return width, total_rows, rows_per_part
+
+    def _part_name(self, worksheet_name: str, part: int) -> str:
+        return worksheet_name if part == 0 else f"{worksheet_name} ({part + 1})"
+
+    def _forget_part(self, previous: dict, part: int) -> None:
+        # The worksheet is new, so nothing recorded for it is on the sheet any more.
+        parts = previous.get("parts", [])
+        if part < len(parts):
+            parts[part] = []
+
+    def _row_hash(self, row: list[str]) -> str:
+        return hashlib.md5(json.dumps(row).encode()).hexdigest()[:16]
+
+    def _publish_report(self, worksheet_name: str, csv_path: Path, width: int, rows_per_part: int,
+                        previous: dict) -> dict:
+        """
+        Diffs the CSV row by row while reading it; only the row hashes and the pending
+        chunk of changed rows are held in memory.
+        """
+        old_parts = previous.get("parts", [])
+        pad_width = max(width, previous.get("width", 0))
+        new_parts: list[list[str]] = []
+
+        def start_part(part: int, header: list[str] | None) -> _PartDiff:
+            old_hashes = old_parts[part] if part < len(old_parts) else []
+            diff = _PartDiff(self, self._part_name(worksheet_name, part), old_hashes, pad_width)
+            if header is not None:
+                diff.add(header)
+            return diff
+
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+
+            diff = start_part(0, header)
+            for row_number, row in enumerate(reader):
+                part, index = divmod(row_number, rows_per_part)
+                if index == 0 and part > 0:
+                    new_parts.append(diff.close())
+                    diff = start_part(part, header)
+                diff.add(row)
+
+            new_parts.append(diff.close())
+
+        # Overflow worksheets the report no longer reaches are blanked.
+        for part in range(len(new_parts), len(old_parts)):
+            start_part(part, None).close()
+
+        return {"width": width, "parts": new_parts}
+
+    def _add_range(self, part_name: str, start_index: int, values: list[list[str]], width: int) -> None:
+        if self._data_rows + len(values) > CommonConfig.SHEETS_CHUNK_ROWS:
+            self._flush()
+
+        self._data.append({
+            "range": a1_range(part_name, start_index + 1, start_index + len(values), width),
+            "values": values,
+        })
+        self._data_rows += len(values)
+
+    def _flush(self) -> None:
+        if not self._data:
+            return
+
+        body = {"valueInputOption": "USER_ENTERED", "data": self._data}
+        self._call(self.spreadsheet.values_batch_update, body=body)
+        logger.info(f"Wrote {self._data_rows} rows in {len(self._data)} ranges to the GSheet.")
+
+        self._data, self._data_rows = [], 0
+
+    def _call(self, method, *args, **kwargs):
+        import gspread
+
+        for attempt in range(CommonConfig.SHEETS_MAX_RETRIES + 1):
+            self.bucket.acquire()
+            try:
+                return method(*args, **kwargs)
+            except gspread.exceptions.APIError as exception:
+                if exception.code not in self.RETRYABLE_STATUS_CODES or attempt == CommonConfig.SHEETS_MAX_RETRIES:
+                    raise
+
+                delay = min(2 ** attempt, 64) + random.random()
+                logger.info(f"Sheets API returned {exception.code}, retrying in {delay:.1f} seconds.")
+                time.sleep(delay)
+
+    def _load_state(self) -> dict:
+        if not self.state_path.exists():
+            return {}
+        with open(self.state_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self, state: dict) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        tmp_path.replace(self.state_path)
+
+
+class _PartDiff:
+    """
+    Compares the rows of one worksheet part, as they are read, with the row hashes of
+    the last publish and hands each run of changed rows (at most SHEETS_CHUNK_ROWS)
+    to the publisher as soon as it ends. Rows past the end of the part are blanked.
+    """
+
+    def __init__(self, publisher: SheetPublisher, part_name: str, old_hashes: list[str], pad_width: int):
+        self.publisher = publisher
+        self.part_name = part_name
+        self.old_hashes = old_hashes
+        self.pad_width = pad_width
+
+        self.hashes: list[str] = []
+        self._run_start = 0
+        self._run_values: list[list[str]] = []
+
+    def add(self, row: list[str]) -> None:
+        index = len(self.hashes)
+        row_hash = self.publisher._row_hash(row)
+        self.hashes.append(row_hash)
+        self._compare(index, row, index >= len(self.old_hashes) or self.old_hashes[index] != row_hash)
+
+    def close(self) -> list[str]:
+        for index in range(len(self.hashes), len(self.old_hashes)):
+            self._compare(index, [], True)
+
+        self._send_run()
+        return self.hashes
+
+    def _compare(self, index: int, row: list[str], changed: bool) -> None:
+        if changed:
+            if not self._run_values:
+                self._run_start = index
+            self._run_values.append(row + [""] * (self.pad_width - len(row)))
+
+        if self._run_values and (not changed or len(self._run_values) >= CommonConfig.SHEETS_CHUNK_ROWS):
+            self._send_run()
+
+    def _send_run(self) -> None:
+        if self._run_values:
+            self.publisher._add_range(self.part_name, self._run_start, self._run_values, self.pad_width)
+            self._run_values = []
+
+# -------------------------------------------
+# Offline Price Index
+# -------------------------------------------
+class PriceIndex:
+    """
+    Local SQLite index of On-Demand prices built from the bulk Price List offer
+    files (JSON or CSV; CSV only for AmazonEC2) for AmazonEC2 (instances, EBS, NAT Gateway, EIP),
+    AmazonVPC (public IPv4), AmazonCloudWatch (Logs), AmazonKinesis and AmazonDynamoDB.
+
+    Build once with PriceIndex.build(files, path); lookups are then indexed local
+    reads, memoized per process.
+    """
+
+    # Region prefix of a usage type, e.g. "USE2-" in "USE2-NatGateway-Hours".
+    USAGE_TYPE_REGION_PREFIX = re.compile(r"^[A-Z]{2,4}\d?-")
+
+    # Offer file attribute name -> column, for the JSON and CSV formats.
+    JSON_ATTRIBUTES = {
+        "servicecode": "service",
+        "regionCode": "region",
+        "location": "location",
+        "usagetype": "usage_type",
+        "instanceType": "instance_type",
+        "operatingSystem": "operating_system",
+        "tenancy": "tenancy",
+        "capacitystatus": "capacity_status",
+        "preInstalledSw": "pre_installed_sw",
+        "licenseModel": "license_model",
+        "volumeApiName": "volume_api_name",
+    }
+    CSV_ATTRIBUTES = {
+        "serviceCode": "service",
+        "Region Code": "region",
+        "Location": "location",
+        "usageType": "usage_type",
+        "Instance Type": "instance_type",
+        "Operating System": "operating_system",
+        "Tenancy": "tenancy",
+        "CapacityStatus": "capacity_status",
+        "Pre Installed S/W": "pre_installed_sw",
+        "License Model": "license_model",
+        "Volume API Name": "volume_api_name",
+    }
+    COLUMNS = [
+        "service", "region", "product_family", "usage_type", "instance_type", "operating_system", "tenancy",
+        "capacity_status", "pre_installed_sw", "license_model", "volume_api_name", "unit", "begin_range", "price_usd",
+        "description",
+    ]
+
+    # License model of the On-Demand SKU an instance runs on, by operating system; the
+    # Windows "Bring your own license" SKUs are priced like Linux.
+    LICENSE_MODELS = {"Windows": "License included"}
+    DEFAULT_LICENSE_MODEL = "No License required"
+
+    def __init__(self, path: Path):
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def is_current(self) -> bool:
+        """
+        False for an index built with an older column layout; it must be rebuilt.
+        """
+        return [row[1] for row in self.conn.execute("PRAGMA table_info(prices)")] == self.COLUMNS
+
+    # ----------------------
+    # Building
+    # ----------------------
+    @classmethod
+    def build(cls, offer_files: list[Path], path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.unlink(missing_ok=True)
+
+        conn = sqlite3.connect(tmp_path)
+        conn.execute(f"CREATE TABLE prices ({', '.join(cls.COLUMNS)})")
+
+        for offer_file in offer_files:
+            rows = cls._read_csv(offer_file) if offer_file.suffix.lower() == ".csv" else cls._read_json(offer_file)
+            placeholders = ", ".join("?" for _ in cls.COLUMNS)
+            cursor = conn.executemany(
+                f"INSERT INTO prices VALUES ({placeholders})",
+                ([row.get(column) for column in cls.COLUMNS] for row in rows),
+            )
+            logger.info(f"Indexed {cursor.rowcount} prices from {offer_file.name}.")
+
+        conn.execute("CREATE INDEX ix_usage_type ON prices (service, region, usage_type)")
+        conn.execute("CREATE INDEX ix_instance_type ON prices (region, instance_type, operating_system)")
+        conn.commit()
+        conn.execute("VACUUM")
+        conn.close()
+
+        tmp_path.replace(path)
+        logger.info(f"Price index written to {path}.")
+
+    @classmethod
+    def _normalize(cls, row: dict) -> dict:
+        if not row.get("region"):
+            row["region"] = next(
+                (code for code, name in EC2Pricing.REGION_NAME_MAP.items() if name == row.get("location")), None
+            )
+        if row.get("usage_type"):
+            row["usage_type"] = cls.USAGE_TYPE_REGION_PREFIX.sub("", row["usage_type"])
+        return row
+
+    @classmethod
+    def _read_json(cls, offer_file: Path):
+        # json.load reads the whole offer into memory, which the multi-GB AmazonEC2
+        # offer does not fit; EC2 prices are only indexed from the CSV download.
+        with open(offer_file, encoding="utf-8") as f:
+            offer_code = re.search(r'"offerCode"\s*:\s*"([^"]+)"', f.read(4096))
+        if offer_code and offer_code.group(1) == "AmazonEC2":
+            raise ValueError(f"{offer_file.name}: index the AmazonEC2 offer from its CSV download, not JSON.")
+
+        with open(offer_file, encoding="utf-8") as f:
+            offer = json.load(f)
+
+        products = offer.get("products", {})
+        for sku, terms in offer.get("terms", {}).get("OnDemand", {}).items():
+            product = products.get(sku)
+            if not product:
+                continue
+
+            attributes = product.get("attributes", {})
+            base = {column: attributes.get(name) for name, column in cls.JSON_ATTRIBUTES.items()}
+            base["product_family"] = product.get("productFamily")
+
+            for term in terms.values():
+                for dim in term.get("priceDimensions", {}).values():
+                    usd = dim.get("pricePerUnit", {}).get("USD")
+                    if usd is None:
+                        continue
+
+                    yield cls._normalize({
+                        **base,
+                        "unit": dim.get("unit"),
+                        "begin_range": float(dim.get("beginRange") or 0),
+                        "price_usd": float(usd),
+                        "description": dim.get("description", ""),
+                    })
+
+    @classmethod
+    def _read_csv(cls, offer_file: Path):
+        with open(offer_file, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+
+            # The header row follows a few lines of offer metadata.
+            header = next(row for row in reader if row and row[0] == "SKU")
+
+            for values in reader:
+                row = dict(zip(header, values))
+                if row.get("TermType") != "OnDemand" or row.get("Currency", "USD") != "USD":
+                    continue
+
+                normalized = {column: row.get(name) or None for name, column in cls.CSV_ATTRIBUTES.items()}
+                normalized.update({
+                    "product_family": row.get("Product Family") or None,
+                    "unit": row.get("Unit"),
+                    "begin_range": float(row.get("StartingRange") or 0),
+                    "price_usd": float(row.get("PricePerUnit") or 0),
+                    "description": row.get("PriceDescription", ""),
+                })
+                yield cls._normalize(normalized)
+
+    # ----------------------
+    # Lookups
+    # ----------------------
+    def _query(self, sql: str, params: tuple) -> list[tuple]:
+        key = (sql, params)
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = self.conn.execute(sql, params).fetchall()
+            return self._cache[key]
+
+    def usage_price(self, service: str, region: str, usage_type: str) -> float:
+        """
+        Price per unit of the first paid tier of a usage type (free tiers are skipped).
+        """
+        rows = self._query(
+            "SELECT price_usd FROM prices WHERE service = ? AND region = ? AND usage_type = ? AND price_usd > 0 "
+            "ORDER BY begin_range LIMIT 1",
+            (service, region, usage_type),
+        )
+        return rows[0][0] if rows else 0.0
+
+    def ec2_hourly_price(self, instance_type: str, region: str, os: str, has_license: bool) -> float:
+        """
+        On-Demand hourly price of a running (capacity status "Used") shared-tenancy
+        instance with its operating system's license model; without a license, only
+        SKUs without pre-installed software match.
+        """
+        software = "" if has_license else "AND pre_installed_sw = 'NA' "
+        rows = self._query(
+            "SELECT description, price_usd FROM prices WHERE region = ? AND instance_type = ? AND operating_system = ? "
+            "AND license_model = ? AND product_family = 'Compute Instance' AND tenancy = 'Shared' "
+            f"AND capacity_status = 'Used' {software}AND unit = 'Hrs' AND price_usd > 0 ORDER BY price_usd, description",
+            (region, instance_type, os, self.LICENSE_MODELS.get(os, self.DEFAULT_LICENSE_MODEL)),
+        )
+
+        for desc, usd in rows:
+            # Same SKU selection as the Pricing API lookup in EC2Pricing.
+            if "Reservation" in desc:
+                continue
+            if has_license != (" with " in desc):
+                continue
+            return usd
+
+        return 0.0
+
+    def ebs_gb_month_price(self, volume_type: str, region: str) -> float:
+        rows = self._query(
+            "SELECT price_usd FROM prices WHERE region = ? AND volume_api_name = ? AND product_family = 'Storage' "
+            "AND unit = 'GB-Mo' AND price_usd > 0 ORDER BY begin_range LIMIT 1",
+            (region, volume_type),
+        )
+        return rows[0][0] if rows else 0.0
+
+
+_price_index = None
+_price_index_outdated = False
+_price_index_lock = threading.Lock()
+
+def get_price_index() -> PriceIndex | None:
+    """
+    Returns the process-wide price index, or None when it has not been built or is
+    outdated.
+    """
+    global _price_index, _price_index_outdated
+
+    with _price_index_lock:
+        if _price_index is None and not _price_index_outdated and CommonConfig.PRICE_INDEX_PATH.exists():
+            price_index = PriceIndex(CommonConfig.PRICE_INDEX_PATH)
+            if price_index.is_current():
+                _price_index = price_index
+            else:
+                _price_index_outdated = True
+                logger.warning("The price index is outdated; rebuild it with build_price_index.py.")
+
+    return _price_index
+
+def monthly_usage_cost(service: str, region: str, usage_type: str, quantity: float, hourly: bool = False) -> float:
+    """
+    Monthly $ for a quantity of a usage type, 0.0 when no price index is available.
+    Hourly usage types are scaled by HOURS_PER_MONTH.
+    """
+    price_index = get_price_index()
+    if price_index is None:
+        return 0.0
+
+    price = price_index.usage_price(service, region, usage_type)
+    return price * quantity * (CommonConfig.HOURS_PER_MONTH if hourly else 1)
 
 # -------------------------------------------
 # AWS EC2 Price Fetcher
@@ -115,10 +1939,9 @@ class EC2Pricing:
         "ap-south-1": "Asia Pacific (Mumbai)",
     }
 
-    def __init__(self, session: boto3.Session = None):
-        session = session or create_boto3_session()
-        self.pricing = session.client("pricing", region_name="us-east-1")
-        self.ec2 = session.client("ec2")
+    def __init__(self, region_name: str = None, account_id: str = None):
+        self.pricing = get_client("pricing", "us-east-1")
+        self.ec2 = get_client("ec2", region_name, account_id)
 
         # Access flags (default True, validated once)
         self.has_on_demand_access = True
@@ -145,8 +1968,13 @@ class EC2Pricing:
         if cache_key in self._cache:
             return self._cache[cache_key]
 
+        price_index = get_price_index()
+
         if lifecycle == "spot" and self.has_spot_access:
             price = self._get_spot_price(instance_type, operating_system)
+        elif lifecycle != "spot" and price_index is not None:
+            has_license = bool(instance.get("ProductCodes"))
+            price = price_index.ec2_hourly_price(instance_type, region, operating_system, has_license)
         elif lifecycle != "spot" and self.has_on_demand_access:
             has_license = bool(instance.get("ProductCodes"))
             price = self._get_on_demand_price(instance_type, region, operating_system, has_license)
@@ -190,6 +2018,11 @@ class EC2Pricing:
                 {"Type": "TERM_MATCH", "Field": "instanceType", "Value": instance_type},
                 {"Type": "TERM_MATCH", "Field": "location", "Value": location},
                 {"Type": "TERM_MATCH", "Field": "operatingSystem", "Value": os},
+                {
+                    "Type": "TERM_MATCH",
+                    "Field": "licenseModel",
+                    "Value": PriceIndex.LICENSE_MODELS.get(os, PriceIndex.DEFAULT_LICENSE_MODEL),
+                },
             ],
         ):
             for raw in page.get("PriceList", []):
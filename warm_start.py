@@ -0,0 +1,16 @@
+"""
+Preloaded into the forkserver by main.py (CommonConfig.WARM_START): boto3, utils and
+the parsed service models are loaded once there, and every worker process forks
+with them already in memory.
+"""
+import boto3  # noqa: F401
+
+# ----------------------
+# Custom Imports
+# ----------------------
+import utils
+import pipelines.base  # noqa: F401
+from settings import CommonConfig
+
+
+utils.preload_service_models(CommonConfig.WARM_START_SERVICES)